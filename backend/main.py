@@ -1,21 +1,60 @@
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import JSONResponse, Response
 from typing import List
 import os
 import uuid
 import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack, asynccontextmanager
 from dotenv import load_dotenv
 
 from services.parser import parse_pdf_to_pages
-from services.ranking import rank_pages_by_importance, select_top_chunks
-from services.gemini_client import generate_cheatsheet
+from services.ranking import rank_pages_by_importance, select_top_chunks, fit_page_vectorizer
+from services.compression import compress_pages
+from services.clustering import assign_to_topics, cluster_pages
+from services.llm_providers import MAX_PROMPT_PAGES, generate_cheatsheet, generate_topics, get_provider
 from services.output_generator import generate_markdown, generate_pdf
+from services.storage import JobNotFoundError, StorageManager
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="Cheatsheet Generator API")
+# Storage directories
+UPLOAD_DIR = "storage/uploads"
+PARSED_DIR = "storage/parsed"
+storage = StorageManager(UPLOAD_DIR, PARSED_DIR)
+MAINTENANCE_INTERVAL = float(os.getenv("STORAGE_MAINTENANCE_INTERVAL", "300"))
+
+MAX_FILES = 20
+
+# Batch jobs run on their own pool so a large batch cannot take every
+# default executor thread; LLM calls themselves are limited by LLM_CONCURRENCY
+# (services.llm_providers) across all requests
+MAX_BATCH_JOBS = int(os.getenv("MAX_BATCH_JOBS", "50"))
+batch_pool = ThreadPoolExecutor(max_workers=int(os.getenv("BATCH_CONCURRENCY", "4")))
+
+
+async def storage_maintenance_loop():
+    """Background TTL cleanup, quota eviction and compaction"""
+    while True:
+        try:
+            await asyncio.to_thread(storage.run_maintenance)
+        except Exception as e:
+            print(f"Storage maintenance failed: {e}")
+        await asyncio.sleep(MAINTENANCE_INTERVAL)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Run storage maintenance in the background while the app is up"""
+    task = asyncio.create_task(storage_maintenance_loop())
+    yield
+    task.cancel()
+
+
+app = FastAPI(title="Cheatsheet Generator API", lifespan=lifespan)
 
 # CORS - allow frontend to connect
 app.add_middleware(
@@ -26,11 +65,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Storage directories
-UPLOAD_DIR = "storage/uploads"
-PARSED_DIR = "storage/parsed"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-os.makedirs(PARSED_DIR, exist_ok=True)
+
+@app.exception_handler(JobNotFoundError)
+async def job_not_found(request, exc):
+    return JSONResponse(status_code=404, content={"detail": "Job not found. Please upload PDFs first."})
 
 
 @app.get("/")
@@ -46,14 +84,36 @@ async def root():
 @app.post("/parse")
 async def parse(
     files: List[UploadFile] = File(...),
-    doc_type: str = Form("cheatsheet")
+    doc_type: str = Form("cheatsheet"),
+    course_id: str = Form(None)
 ):
     """
     Step 1: Upload and parse PDFs
+    course_id (optional) groups jobs of the same course for /generate/batch
     Returns job_id for tracking
     """
-    if len(files) > 20:
-        raise HTTPException(status_code=400, detail="Maximum 20 files allowed")
+    validate_uploads(files)
+
+    # Create job
+    job_id = str(uuid.uuid4())
+
+    async with storage.using(job_id, create=True):
+        outputs = await parse_uploads(job_id, files, doc_type, course_id)
+
+    return {
+        "job_id": job_id,
+        "doc_type": doc_type,
+        "course_id": course_id,
+        "pdfs": outputs,
+        "pages_total": sum(o["pages"] for o in outputs),
+        "status": "parsed"
+    }
+
+
+def validate_uploads(files, existing=0):
+    """Check file count (including files already in the job) and types"""
+    if len(files) + existing > MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Maximum {MAX_FILES} files allowed")
     
     if not files:
         raise HTTPException(status_code=400, detail="No files provided")
@@ -63,20 +123,34 @@ async def parse(
         if not f.filename.endswith('.pdf'):
             raise HTTPException(status_code=400, detail=f"Invalid file type: {f.filename}. Only PDFs allowed.")
 
-    # Create job
-    job_id = str(uuid.uuid4())
-    job_out_dir = os.path.join(PARSED_DIR, job_id)
-    os.makedirs(job_out_dir, exist_ok=True)
 
-    total_pages = 0
+def ready_provider(name):
+    """LLM provider by name: 400 if unknown, 500 if it cannot be used (e.g. missing API key)"""
+    try:
+        llm = get_provider(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        llm.check_ready()
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return llm
+
+
+async def parse_uploads(job_id, files, doc_type, course_id=None, start_index=0):
+    """
+    Save and parse uploaded PDFs into storage/parsed/<job_id>/pdf_NN.json
+    Returns per-PDF summaries
+    """
+    job_out_dir = storage.job_dir(job_id)
     outputs = []
 
     # Process each PDF in order
-    for i, f in enumerate(files):
+    for i, f in enumerate(files, start=start_index):
         filename = f"{i:02d}_{f.filename}"
         save_path = os.path.join(UPLOAD_DIR, f"{job_id}_{filename}")
 
-        # Save uploaded file
+        # Save uploaded file (deleted by storage compaction once parsed)
         with open(save_path, "wb") as out:
             content = await f.read()
             out.write(content)
@@ -84,20 +158,19 @@ async def parse(
         # Parse PDF
         try:
             pages = parse_pdf_to_pages(save_path)
-            total_pages += len(pages)
 
             # Save parsed data
             out_json = {
                 "job_id": job_id,
                 "doc_type": doc_type,
+                "course_id": course_id,
                 "pdf_index": i,
                 "pdf_name": f.filename,
                 "pages": pages
             }
 
             out_path = os.path.join(job_out_dir, f"pdf_{i:02d}.json")
-            with open(out_path, "w", encoding="utf-8") as fp:
-                json.dump(out_json, fp, ensure_ascii=False, indent=2)
+            storage.write_json(out_path, out_json)
 
             outputs.append({
                 "pdf_index": i,
@@ -107,95 +180,505 @@ async def parse(
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error parsing {f.filename}: {str(e)}")
 
-    return {
-        "job_id": job_id,
-        "doc_type": doc_type,
-        "pdfs": outputs,
-        "pages_total": total_pages,
-        "status": "parsed"
-    }
+    return outputs
 
 
-@app.post("/generate")
-async def generate(job_id: str = Form(...)):
+def load_job_pages(job_id):
     """
-    Step 2: Generate cheatsheet from parsed PDFs
-    Uses Gemini API with moderate compression
+    Load all parsed pages of a job (plain or compacted files)
+    Returns (all_pages, doc_type, course_id)
     """
-    job_dir = os.path.join(PARSED_DIR, job_id)
-    
-    if not os.path.exists(job_dir):
-        raise HTTPException(status_code=404, detail="Job not found. Please upload PDFs first.")
-    
-    # Check if Gemini API key is set
-    if not os.getenv("GEMINI_API_KEY"):
-        raise HTTPException(
-            status_code=500,
-            detail="Gemini API key not configured. Please set GEMINI_API_KEY in .env file"
-        )
-    
-    # Load all parsed pages
+    job_dir = storage.job_dir(job_id)
     all_pages = []
     doc_type = "cheatsheet"
+    course_id = None
     
-    json_files = sorted([f for f in os.listdir(job_dir) if f.endswith(".json") and f.startswith("pdf_")])
+    json_files = storage.parsed_files(job_id)
     
     if not json_files:
         raise HTTPException(status_code=404, detail="No parsed data found for this job")
     
     for filename in json_files:
-        with open(os.path.join(job_dir, filename), "r", encoding="utf-8") as f:
-            data = json.load(f)
-            doc_type = data.get("doc_type", "cheatsheet")
-            # Add metadata to each page
-            for page in data["pages"]:
-                page["pdf_name"] = data["pdf_name"]
-                page["pdf_index"] = data["pdf_index"]
-            all_pages.extend(data["pages"])
+        data = storage.load_json(os.path.join(job_dir, filename))
+        doc_type = data.get("doc_type", "cheatsheet")
+        course_id = data.get("course_id")
+        # Add metadata to each page
+        for page in data["pages"]:
+            page["pdf_name"] = data["pdf_name"]
+            page["pdf_index"] = data["pdf_index"]
+        all_pages.extend(data["pages"])
     
     if not all_pages:
         raise HTTPException(status_code=404, detail="No pages found in parsed data")
     
-    try:
-        # Rank pages by importance
-        ranked_pages = rank_pages_by_importance(all_pages)
+    return all_pages, doc_type, course_id
+
+
+def select_pages(all_pages, vectorizer):
+    """Rank, select and compress pages for the LLM call"""
+    # Rank pages by importance
+    ranked_pages = rank_pages_by_importance(all_pages, vectorizer)
+    
+    # Select top chunks (moderate approach - ~80-100 pages)
+    top_pages = select_top_chunks(ranked_pages, max_pages=80)
+    
+    # Extractive pre-summarization to shrink the prompt
+    return compress_pages(top_pages, vectorizer)
+
+
+def prepare_pages(all_pages, vectorizer):
+    """
+    Rank, select and compress pages for the LLM call
+    Returns (top_pages, topics) - topics groups top_pages for per-topic prompts
+    """
+    top_pages = select_pages(all_pages, vectorizer)
+    
+    # Group into topics, each prompted separately
+    topics = cluster_pages(top_pages, vectorizer)
+    return top_pages, topics
+
+
+def save_result(job_id, result, all_pages, top_pages, doc_type):
+    """Save generated cheatsheet and metadata for a job"""
+    job_dir = storage.job_dir(job_id)
+    
+    # Save result
+    output_path = os.path.join(job_dir, "cheatsheet.json")
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    
+    # Save metadata
+    meta_path = os.path.join(job_dir, "metadata.json")
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "pages_total": len(all_pages),
+            "pages_selected": len(top_pages),
+            "doc_type": doc_type,
+            "sections": len(result.get("sections", [])),
+            "topics": len({s.get("topic") for s in result.get("sections", [])})
+        }, f, indent=2)
+
+
+def generation_status(result):
+    """Response status: "partial" lists topics that still failed after a retry"""
+    if not result.get("failed_topics"):
+        return {"status": "success"}
+    return {
+        "status": "partial",
+        "failed_topics": result["failed_topics"],
+        "topic_errors": result.get("topic_errors", [])
+    }
+
+
+@app.post("/generate")
+async def generate(job_id: str = Form(...), provider: str = Form(None)):
+    """
+    Step 2: Generate cheatsheet from parsed PDFs
+    Uses the configured LLM provider (LLM_PROVIDER, default Gemini) with moderate compression
+    """
+    # Check the provider is usable (e.g. Gemini API key is set)
+    llm = ready_provider(provider)
+    
+    # using raises JobNotFoundError (404) if the job is gone; exclusive
+    # so an append/remove cannot interleave with writing the cheatsheet
+    async with storage.using(job_id, exclusive=True):
+        # Load all parsed pages
+        all_pages, doc_type, _ = load_job_pages(job_id)
+        
+        try:
+            # TF-IDF and clustering are CPU-bound: keep them off the event loop
+            vectorizer = await asyncio.to_thread(fit_page_vectorizer, all_pages)
+            top_pages, topics = await asyncio.to_thread(prepare_pages, all_pages, vectorizer)
+            
+            # Generate with the LLM provider (retries run off the event loop)
+            result = await asyncio.to_thread(generate_cheatsheet, top_pages, doc_type, llm, topics)
+            
+            # Check for errors
+            if "error" in result:
+                raise HTTPException(status_code=500, detail=f"LLM error: {result['error']}")
+            
+            save_result(job_id, result, all_pages, top_pages, doc_type)
+            
+            return {
+                "job_id": job_id,
+                **generation_status(result),
+                "pages_processed": len(all_pages),
+                "pages_selected": len(top_pages),
+                "sections_generated": len(result.get("sections", [])),
+                "preview": result
+            }
         
-        # Select top chunks (moderate approach - ~80-100 pages)
-        top_pages = select_top_chunks(ranked_pages, max_pages=80)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
+
+
+def load_and_rank_jobs(job_ids):
+    """
+    Load jobs, group them by course (jobs without one stand alone) and rank
+    each group with one vectorizer fitted on all of its pages
+    Returns (jobs, groups, errors)
+    """
+    jobs = {}
+    groups = {}
+    errors = {}
+    for job_id in job_ids:
+        try:
+            all_pages, doc_type, course_id = load_job_pages(job_id)
+        except HTTPException as e:
+            errors[job_id] = {"job_id": job_id, "status": "error", "error": e.detail}
+            continue
+        jobs[job_id] = {"all_pages": all_pages, "doc_type": doc_type}
+        groups.setdefault(course_id or f"job:{job_id}", []).append(job_id)
+    
+    for group_job_ids in groups.values():
+        group_pages = [p for j in group_job_ids for p in jobs[j]["all_pages"]]
+        vectorizer = fit_page_vectorizer(group_pages)
+        for job_id in group_job_ids:
+            top_pages, topics = prepare_pages(jobs[job_id]["all_pages"], vectorizer)
+            jobs[job_id]["top_pages"] = top_pages
+            jobs[job_id]["topics"] = topics
+    
+    return jobs, groups, errors
+
+
+@app.post("/generate/batch")
+async def generate_batch(job_ids: List[str] = Form(...), provider: str = Form(None)):
+    """
+    Generate cheatsheets for many jobs in one request
+    Jobs with the same course_id share one fitted TF-IDF vectorizer,
+    and jobs run concurrently (LLM calls share the LLM_CONCURRENCY limit)
+    Per-job failures are reported without failing the batch
+    """
+    job_ids = list(dict.fromkeys(job_ids))  # Dedupe, keep order
+    
+    if not job_ids:
+        raise HTTPException(status_code=400, detail="No job_ids provided")
+    
+    if len(job_ids) > MAX_BATCH_JOBS:
+        raise HTTPException(status_code=400, detail=f"Maximum {MAX_BATCH_JOBS} jobs per batch")
+    
+    llm = ready_provider(provider)
+    
+    results = {}
+    
+    async with AsyncExitStack() as stack:
+        found = []
+        # Jobs are locked in a fixed order so overlapping batches cannot deadlock
+        for job_id in sorted(job_ids):
+            try:
+                await stack.enter_async_context(storage.using(job_id, exclusive=True))
+            except JobNotFoundError:
+                results[job_id] = {"job_id": job_id, "status": "error", "error": "Job not found"}
+                continue
+            found.append(job_id)
         
-        # Generate with Gemini API
-        result = generate_cheatsheet(top_pages, doc_type)
+        # Loading, TF-IDF and clustering are CPU-bound: keep them off the event loop
+        jobs, groups, load_errors = await asyncio.to_thread(load_and_rank_jobs, found)
+        results.update(load_errors)
         
-        # Check for errors
-        if "error" in result:
-            raise HTTPException(status_code=500, detail=f"Gemini API error: {result['error']}")
+        loop = asyncio.get_running_loop()
         
-        # Save result
-        output_path = os.path.join(job_dir, "cheatsheet.json")
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(result, f, indent=2, ensure_ascii=False)
+        async def run_job(job_id):
+            job = jobs[job_id]
+            try:
+                result = await loop.run_in_executor(
+                    batch_pool, generate_cheatsheet, job["top_pages"], job["doc_type"], llm, job["topics"]
+                )
+                if "error" in result:
+                    return {"job_id": job_id, "status": "error", "error": f"LLM error: {result['error']}"}
+                save_result(job_id, result, job["all_pages"], job["top_pages"], job["doc_type"])
+                return {
+                    "job_id": job_id,
+                    **generation_status(result),
+                    "pages_processed": len(job["all_pages"]),
+                    "pages_selected": len(job["top_pages"]),
+                    "sections_generated": len(result.get("sections", []))
+                }
+            except Exception as e:
+                return {"job_id": job_id, "status": "error", "error": f"Generation failed: {str(e)}"}
         
-        # Save metadata
-        meta_path = os.path.join(job_dir, "metadata.json")
-        with open(meta_path, "w", encoding="utf-8") as f:
-            json.dump({
-                "pages_total": len(all_pages),
-                "pages_selected": len(top_pages),
-                "doc_type": doc_type,
-                "sections": len(result.get("sections", []))
-            }, f, indent=2)
+        for outcome in await asyncio.gather(*(run_job(j) for j in jobs)):
+            results[outcome["job_id"]] = outcome
+    
+    ordered = [results[j] for j in job_ids]
+    return {
+        "status": "success" if all(r["status"] == "success" for r in ordered) else "partial",
+        "jobs_total": len(ordered),
+        "jobs_succeeded": sum(r["status"] == "success" for r in ordered),
+        "course_groups": len(groups),
+        "jobs": ordered
+    }
+
+
+def load_cheatsheet(job_id):
+    """Stored cheatsheet.json of a job, or None if not generated yet"""
+    path = os.path.join(storage.job_dir(job_id), "cheatsheet.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def selected_refs(sections):
+    """Unique [pdf_index, page] source references across sections"""
+    return {tuple(ref) for s in sections for ref in s.get("source_pages", [])}
+
+
+def topic_pages(sections, all_pages):
+    """Pages each topic was generated from ({topic: pages}), skipping pages no longer in the job"""
+    page_lookup = {(p["pdf_index"], p["page"]): p for p in all_pages}
+    topics = {}
+    for s in sections:
+        topics.setdefault(s.get("topic"), [
+            page_lookup[tuple(ref)] for ref in s.get("source_pages", []) if tuple(ref) in page_lookup
+        ])
+    return topics
+
+
+def replace_topics(sections, replacements):
+    """Sections with each topic in replacements swapped in place (an empty list drops it)"""
+    merged = []
+    emitted = set()
+    for s in sections:
+        t = s.get("topic")
+        if t not in replacements:
+            merged.append(s)
+        elif t not in emitted:
+            merged.extend(replacements[t])
+            emitted.add(t)
+    return merged
+
+
+def remove_pdf_files(job_id, pdf_index):
+    """Delete a PDF's parsed data and any raw upload left for it"""
+    job_dir = storage.job_dir(job_id)
+    for name in (f"pdf_{pdf_index:02d}.json", f"pdf_{pdf_index:02d}.json.gz"):
+        try:
+            os.remove(os.path.join(job_dir, name))
+        except FileNotFoundError:
+            pass
+    for name in os.listdir(UPLOAD_DIR):
+        if name.startswith(f"{job_id}_{pdf_index:02d}_"):
+            os.remove(os.path.join(UPLOAD_DIR, name))
+
+
+def rollback_files(job_id, first_pdf, count):
+    """Remove PDFs appended by a request that failed"""
+    for pdf_index in range(first_pdf, first_pdf + count):
+        remove_pdf_files(job_id, pdf_index)
+
+
+def check_incremental(cheatsheet):
+    """Incremental updates need the topic/source page tags added at generation"""
+    if any("source_pages" not in s for s in cheatsheet.get("sections", [])):
+        raise HTTPException(
+            status_code=409,
+            detail="Cheatsheet has no source page references. Please regenerate it using /generate endpoint."
+        )
+
+
+def compress_topics(topics, vectorizer):
+    """Extractive summaries for topics rebuilt from stored pages"""
+    for topic in topics:
+        compress_pages(topic, vectorizer)
+
+
+def generate_topic_sections(topics, topic_ids, doc_type, llm, topic_count):
+    """
+    Generate topics of an incremental update
+    Returns ({topic: sections} for topics that succeeded, failed results);
+    raises 500 if every topic failed, so nothing is changed
+    """
+    results = generate_topics(topics, doc_type, llm, topic_ids, topic_count)
+    generated = {r["topic"]: r.get("sections", []) for r in results if "error" not in r}
+    failed = [r for r in results if "error" in r]
+    if results and not generated:
+        raise HTTPException(status_code=500, detail=f"LLM error: {failed[0]['error']}")
+    return generated, failed
+
+
+def failed_topics_status(failed):
+    """generation_status for the failed results of generate_topic_sections"""
+    return generation_status({
+        "failed_topics": [r["topic"] for r in failed],
+        "topic_errors": [r["error"] for r in failed]
+    })
+
+
+@app.post("/jobs/{job_id}/files")
+async def append_files(
+    job_id: str,
+    files: List[UploadFile] = File(...),
+    provider: str = Form(None)
+):
+    """
+    Append PDFs to an existing job
+    Only the new files are parsed; if a cheatsheet exists, each selected new
+    page joins the existing topic it is closest to (which is regenerated),
+    and pages that fit no topic form new topics. Other sections are kept;
+    a topic that fails to regenerate keeps its old sections ("partial").
+    If parsing or generation fails, the new files are removed again.
+    """
+    # using raises JobNotFoundError (404) if the job is gone; exclusive
+    # so concurrent changes to the job cannot pick the same pdf index
+    async with storage.using(job_id, exclusive=True):
+        _, doc_type, course_id = load_job_pages(job_id)
+        validate_uploads(files, existing=len(storage.parsed_files(job_id)))
+        
+        cheatsheet = load_cheatsheet(job_id)
+        if cheatsheet is not None:
+            check_incremental(cheatsheet)
+            llm = ready_provider(provider)
         
-        return {
+        # Parse only the new files, numbered after the existing ones
+        first_pdf = storage.next_pdf_index(job_id)
+        try:
+            outputs = await parse_uploads(job_id, files, doc_type, course_id, start_index=first_pdf)
+        except Exception:
+            rollback_files(job_id, first_pdf, len(files))
+            raise
+        
+        response = {
             "job_id": job_id,
-            "status": "success",
-            "pages_processed": len(all_pages),
-            "pages_selected": len(top_pages),
-            "sections_generated": len(result.get("sections", [])),
-            "preview": result
+            "pdfs": outputs,
+            "pages_added": sum(o["pages"] for o in outputs),
+            "status": "parsed"
         }
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
+        
+        if cheatsheet is None:
+            return response
+        
+        try:
+            all_pages, _, _ = load_job_pages(job_id)
+            new_indices = {o["pdf_index"] for o in outputs}
+            new_pages = [p for p in all_pages if p["pdf_index"] in new_indices]
+            sections = cheatsheet.get("sections", [])
+            
+            # Vocabulary from the whole job, selection among the new pages only
+            vectorizer = await asyncio.to_thread(fit_page_vectorizer, all_pages)
+            top_pages = await asyncio.to_thread(select_pages, new_pages, vectorizer)
+            
+            # New pages join the nearest existing topic (while it has room
+            # in one prompt), the rest form new topics
+            existing_topics = topic_pages(sections, all_pages)
+            assigned, unassigned = await asyncio.to_thread(
+                assign_to_topics, top_pages, existing_topics, vectorizer, max_pages=MAX_PROMPT_PAGES
+            )
+            new_topics = await asyncio.to_thread(cluster_pages, unassigned, vectorizer)
+            
+            first_topic = max((t for t in existing_topics if t is not None), default=-1) + 1
+            topic_ids = list(assigned) + list(range(first_topic, first_topic + len(new_topics)))
+            topics = [existing_topics[t] + assigned[t] for t in assigned] + new_topics
+            await asyncio.to_thread(compress_topics, topics[:len(assigned)], vectorizer)
+            
+            generated, failed = await asyncio.to_thread(
+                generate_topic_sections, topics, topic_ids, doc_type, llm, len(existing_topics) + len(new_topics)
+            )
+            
+            # Regenerated topics are replaced in place (a failed one keeps its
+            # old sections), new topics are appended
+            regenerated = {t: v for t, v in generated.items() if t in assigned}
+            added = [s for t, v in generated.items() if t not in assigned for s in v]
+            cheatsheet["sections"] = replace_topics(sections, regenerated) + added
+            save_result(job_id, cheatsheet, all_pages, selected_refs(cheatsheet["sections"]), doc_type)
+            
+            response.update({
+                **failed_topics_status(failed),
+                "sections_kept": sum(1 for s in sections if s.get("topic") not in regenerated),
+                "sections_generated": sum(len(v) for v in generated.values()),
+                "topics_regenerated": len(regenerated),
+                "topics_generated": len(generated) - len(regenerated),
+                "preview": cheatsheet
+            })
+            return response
+        
+        except Exception as e:
+            # The job must look as it did before the request
+            rollback_files(job_id, first_pdf, len(files))
+            if isinstance(e, HTTPException):
+                raise
+            raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
+
+
+@app.delete("/jobs/{job_id}/files/{pdf_index}")
+async def remove_file(job_id: str, pdf_index: int, provider: str = None):
+    """
+    Remove a PDF from an existing job
+    Only topics that drew on the removed PDF are regenerated (from their
+    remaining pages); topics left without pages are dropped. A topic that
+    fails to regenerate keeps its old sections ("partial").
+    """
+    # using raises JobNotFoundError (404) if the job is gone
+    async with storage.using(job_id, exclusive=True):
+        parsed = storage.parsed_files(job_id)
+        if not any(f in (f"pdf_{pdf_index:02d}.json", f"pdf_{pdf_index:02d}.json.gz") for f in parsed):
+            raise HTTPException(status_code=404, detail=f"PDF {pdf_index} not found in this job")
+        if len(parsed) == 1:
+            raise HTTPException(status_code=400, detail="Cannot remove the only PDF of a job")
+        
+        cheatsheet = load_cheatsheet(job_id)
+        if cheatsheet is not None:
+            check_incremental(cheatsheet)
+            llm = ready_provider(provider)
+        
+        response = {"job_id": job_id, "pdf_removed": pdf_index, "status": "removed"}
+        
+        if cheatsheet is None:
+            remove_pdf_files(job_id, pdf_index)
+            return response
+        
+        try:
+            all_pages, doc_type, _ = load_job_pages(job_id)
+            all_pages = [p for p in all_pages if p["pdf_index"] != pdf_index]
+            
+            # Topics that used pages of the removed PDF
+            sections = cheatsheet.get("sections", [])
+            remaining = topic_pages(sections, all_pages)
+            affected = {
+                s.get("topic") for s in sections
+                if any(ref[0] == pdf_index for ref in s["source_pages"])
+            }
+            
+            regenerate = {t: remaining[t] for t in affected if remaining[t]}
+            generated, failed = {}, []
+            if regenerate:
+                vectorizer = await asyncio.to_thread(fit_page_vectorizer, all_pages)
+                topic_ids = list(regenerate)
+                topics = [regenerate[t] for t in topic_ids]
+                await asyncio.to_thread(compress_topics, topics, vectorizer)
+                
+                topic_count = len({s.get("topic") for s in sections})
+                generated, failed = await asyncio.to_thread(
+                    generate_topic_sections, topics, topic_ids, doc_type, llm, topic_count
+                )
+            
+            # Replace affected topics in place, drop emptied ones, keep
+            # everything else; a failed topic keeps its sections, minus the
+            # references to the removed PDF
+            dropped = {t: [] for t in affected if t not in regenerate}
+            merged = replace_topics(sections, {**generated, **dropped})
+            for s in merged:
+                s["source_pages"] = [ref for ref in s["source_pages"] if ref[0] != pdf_index]
+            
+            # Files go only once the cheatsheet no longer depends on them
+            remove_pdf_files(job_id, pdf_index)
+            cheatsheet["sections"] = merged
+            save_result(job_id, cheatsheet, all_pages, selected_refs(merged), doc_type)
+            
+            response.update({
+                **failed_topics_status(failed),
+                "sections_kept": sum(1 for s in sections if s.get("topic") not in affected),
+                "sections_generated": sum(len(v) for v in generated.values()),
+                "topics_regenerated": len(generated),
+                "topics_dropped": len(dropped),
+                "preview": cheatsheet
+            })
+            return response
+        
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
 
 
 @app.get("/download/{job_id}")
@@ -215,6 +698,7 @@ async def download(job_id: str, format: str = "markdown"):
     # Load cheatsheet data
     with open(result_path, "r", encoding="utf-8") as f:
         data = json.load(f)
+    storage.touch(job_id)
     
     # Generate requested format
     if format == "markdown":
@@ -252,10 +736,10 @@ async def status(job_id: str):
     """Check status of a job"""
     job_dir = os.path.join(PARSED_DIR, job_id)
     
-    if not os.path.exists(job_dir):
+    try:
+        has_parsed = bool(storage.parsed_files(job_id))
+    except FileNotFoundError:
         return {"status": "not_found"}
-    
-    has_parsed = any(f.startswith("pdf_") and f.endswith(".json") for f in os.listdir(job_dir))
     has_cheatsheet = os.path.exists(os.path.join(job_dir, "cheatsheet.json"))
     
     meta_path = os.path.join(job_dir, "metadata.json")
@@ -268,7 +752,11 @@ async def status(job_id: str):
         "job_id": job_id,
         "parsed": has_parsed,
         "generated": has_cheatsheet,
-        "metadata": metadata
+        "metadata": metadata,
+        "storage": {
+            "job_bytes": storage.job_bytes(job_id),
+            **storage.usage()
+        }
     }
 
 
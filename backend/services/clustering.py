@@ -0,0 +1,112 @@
+import math
+import os
+
+import numpy as np
+from sklearn.cluster import KMeans
+
+
+def _doc_order(page):
+    return (page.get("pdf_index", 0), page.get("page", 0))
+
+
+def cluster_pages(pages, vectorizer=None, pages_per_topic=None, max_topics=None):
+    """
+    Group selected pages into topics with k-means on their TF-IDF vectors
+
+    Number of topics is about len(pages) / pages_per_topic, capped at max_topics.
+    Pages within a topic, and topics themselves, are in document order.
+    Falls back to consecutive document-order chunks if TF-IDF is unavailable.
+
+    Returns: list of page lists (one per topic)
+    """
+    if not pages:
+        return []
+
+    pages_per_topic = pages_per_topic or int(os.getenv("TOPIC_PAGES", "12"))
+    max_topics = max_topics or int(os.getenv("TOPIC_MAX", "8"))
+
+    ordered = sorted(pages, key=_doc_order)
+    n_topics = max(1, min(max_topics, math.ceil(len(ordered) / pages_per_topic)))
+    if n_topics == 1:
+        return [ordered]
+
+    labels = None
+    if vectorizer is not None:
+        try:
+            matrix = vectorizer.transform([p.get("full_text", "") for p in ordered])
+            if matrix.nnz:
+                labels = KMeans(n_clusters=n_topics, n_init=10, random_state=0).fit_predict(matrix)
+        except Exception as e:
+            print(f"Topic clustering failed: {e}, using document order")
+
+    if labels is None:
+        # Consecutive chunks keep neighbouring pages together
+        size = math.ceil(len(ordered) / n_topics)
+        return [ordered[i:i + size] for i in range(0, len(ordered), size)]
+
+    topics = {}
+    for page, label in zip(ordered, labels):
+        topics.setdefault(int(label), []).append(page)
+
+    # Topics ordered by their first page
+    return sorted(topics.values(), key=lambda t: _doc_order(t[0]))
+
+
+def assign_to_topics(pages, topics, vectorizer=None, min_similarity=None, max_pages=None):
+    """
+    Assign pages to the nearest existing topic by cosine similarity between
+    the page's TF-IDF vector and the topic centroid (mean of its pages)
+
+    topics: {topic_id: list of pages}
+    Pages less similar than min_similarity to every topic are left unassigned,
+    as are pages that would grow a topic beyond max_pages (most similar
+    pages are assigned first).
+
+    Returns: ({topic_id: assigned pages}, unassigned pages), in document order
+    """
+    min_similarity = min_similarity if min_similarity is not None else float(os.getenv("TOPIC_ASSIGN_MIN_SIMILARITY", "0.2"))
+    ordered = sorted(pages, key=_doc_order)
+    topic_ids = [t for t, topic_pages in topics.items() if topic_pages]
+    if not ordered or not topic_ids or vectorizer is None:
+        return {}, ordered
+
+    try:
+        texts = [p.get("full_text", "") for p in ordered]
+        for t in topic_ids:
+            texts.extend(p.get("full_text", "") for p in topics[t])
+        matrix = vectorizer.transform(texts)
+    except Exception as e:
+        print(f"Topic assignment failed: {e}, treating pages as new topics")
+        return {}, ordered
+
+    page_vectors = matrix[:len(ordered)]
+    centroids = []
+    offset = len(ordered)
+    for t in topic_ids:
+        count = len(topics[t])
+        centroid = np.asarray(matrix[offset:offset + count].mean(axis=0)).flatten()
+        norm = np.linalg.norm(centroid)
+        centroids.append(centroid / norm if norm else centroid)
+        offset += count
+
+    # TF-IDF rows are L2-normalised, so the dot product is the cosine
+    similarity = page_vectors @ np.array(centroids).T
+    best = similarity.argmax(axis=1)
+    best_score = similarity[np.arange(len(ordered)), best]
+
+    room = {t: (max_pages - len(topics[t]) if max_pages else len(ordered)) for t in topic_ids}
+    placed = {}  # page position -> topic_id
+    for i in np.argsort(-best_score, kind="stable"):
+        t = topic_ids[best[i]]
+        if best_score[i] >= min_similarity and room[t] > 0:
+            placed[int(i)] = t
+            room[t] -= 1
+
+    assigned = {}
+    unassigned = []
+    for i, page in enumerate(ordered):
+        if i in placed:
+            assigned.setdefault(placed[i], []).append(page)
+        else:
+            unassigned.append(page)
+    return assigned, unassigned
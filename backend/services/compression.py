@@ -0,0 +1,90 @@
+import re
+import numpy as np
+
+from services.parser import extract_definitions, split_sentences
+
+
+# Sentence looks like it carries math (kept verbatim)
+MATH_HINT = re.compile(r'[$=\\^_∑∫≤≥≈±×÷√∞∂]')
+
+
+def _must_keep(sentence, formulas):
+    """Formula and definition sentences are always kept verbatim"""
+    if extract_definitions(sentence):
+        return True
+    if any(f in sentence for f in formulas):
+        return True
+    return bool(MATH_HINT.search(sentence))
+
+
+def _fit(sentence, budget):
+    """Sentence cut to at most budget chars, at a word boundary where possible"""
+    if len(sentence) <= budget:
+        return sentence
+    if budget <= 0:
+        return ""
+    cut = sentence[:budget]
+    return cut.rsplit(" ", 1)[0] if " " in cut else cut
+
+
+def compress_pages(pages, vectorizer=None, max_chars=1200):
+    """
+    Extractive pre-summarization before the LLM call
+
+    For each page, keep formula/definition sentences verbatim, then fill the
+    remaining budget with the highest TF-IDF scoring sentences, in original
+    order. Result is stored in page["summary_text"].
+
+    vectorizer: fitted TF-IDF vectorizer from ranking (lead sentences are
+    preferred if None)
+    """
+    page_sentences = [split_sentences(p.get("full_text", "")) for p in pages]
+
+    # Score every sentence in one transform call
+    flat = [s for sentences in page_sentences for s in sentences]
+    scores = None
+    if vectorizer is not None and flat:
+        try:
+            scores = np.asarray(vectorizer.transform(flat).sum(axis=1)).flatten()
+        except Exception as e:
+            print(f"Sentence scoring failed: {e}, keeping lead sentences")
+
+    offset = 0
+    for page, sentences in zip(pages, page_sentences):
+        count = len(sentences)
+        if scores is not None:
+            page_scores = scores[offset:offset + count]
+        else:
+            # Earlier sentences first
+            page_scores = -np.arange(count, dtype=float)
+        offset += count
+
+        full_text = page.get("full_text", "")
+        if len(full_text) <= max_chars:
+            page["summary_text"] = full_text
+            continue
+
+        formulas = page.get("formulas", [])
+        keep = {}  # sentence index -> kept text
+        used = 0
+        for i, s in enumerate(sentences):
+            # Formula-heavy pages may overrun the budget, but not unboundedly
+            if _must_keep(s, formulas) and used < 2 * max_chars:
+                keep[i] = _fit(s, 2 * max_chars - used)
+                used += len(keep[i]) + 1
+
+        for i in np.argsort(-page_scores, kind="stable"):
+            if used >= max_chars:
+                break
+            i = int(i)
+            if i in keep:
+                continue
+            # An oversized "sentence" (e.g. unpunctuated slide text) is cut
+            # to the remaining budget instead of being skipped
+            keep[i] = _fit(sentences[i], max_chars - used)
+            used += len(keep[i]) + 1
+
+        summary = " ".join(keep[i] for i in sorted(keep) if keep[i])
+        page["summary_text"] = summary if summary.strip() else full_text[:max_chars]
+
+    return pages
@@ -3,6 +3,10 @@ import json
 import os
 import re
 
+from services.json_repair import loads_repaired
+from services.llm_providers import MAX_PROMPT_PAGES
+from services.llm_resilience import call_with_resilience
+
 
 def configure_gemini():
     """Configure Gemini API"""
@@ -14,51 +18,100 @@ def configure_gemini():
 
 def fix_json_escaping(text):
     """
-    Fix common JSON escaping issues with LaTeX formulas
+    Parse model output as JSON, repairing LaTeX escaping, unterminated
+    strings and truncated output (see services.json_repair)
     """
-    # This is a safer approach - find strings and properly escape backslashes
-    try:
-        # First attempt: try to parse as-is
-        return json.loads(text)
-    except json.JSONDecodeError:
-        # If that fails, manually escape backslashes in formula-like contexts
-        # Replace single backslash with double backslash, but be careful not to double-escape
-        fixed = text.replace('\\', '\\\\')
-        # Fix over-escaping of already escaped characters
-        fixed = fixed.replace('\\\\\\\\', '\\\\')
-        fixed = fixed.replace('\\\\"', '\\"')
-        fixed = fixed.replace('\\\\n', '\\n')
-        fixed = fixed.replace('\\\\t', '\\t')
-        return json.loads(fixed)
-
-
-def generate_cheatsheet(pages, doc_type="cheatsheet"):
+    return clean_cheatsheet(loads_repaired(text))
+
+
+def clean_cheatsheet(result):
     """
-    Generate cheatsheet from selected pages using Gemini API
-    Uses moderate compression approach (full text sent)
+    Drop sections/bullets left empty by truncation repair
+    so a cut-off response still yields every complete section
+    (formula-only bullets are kept)
     """
-    configure_gemini()
-    
-    model = genai.GenerativeModel(
-        'gemini-2.5-flash-lite',
+    if not isinstance(result, dict):
+        raise json.JSONDecodeError("Expected a JSON object", "", 0)
+
+    sections = []
+    for section in result.get("sections", []):
+        if not isinstance(section, dict):
+            continue
+        bullets = [
+            b for b in section.get("bullets", [])
+            if isinstance(b, dict) and (b.get("text") or b.get("formulas"))
+        ]
+        if bullets:
+            section["bullets"] = bullets
+            sections.append(section)
+
+    result["sections"] = sections
+    return result
+
+
+# Output token budget for a whole cheatsheet (split across topics)
+MAX_OUTPUT_TOKENS = 8192
+
+
+def build_models(share=1.0):
+    """
+    Primary model plus a cheaper fallback config, tried in order
+    by call_with_resilience
+    share: fraction of the full output budget this call may use
+    """
+    primary = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite")
+    fallback = os.getenv("GEMINI_FALLBACK_MODEL", "gemini-2.0-flash-lite")
+
+    models = [(primary, genai.GenerativeModel(
+        primary,
         generation_config={
             "temperature": 0.3,
-            "max_output_tokens": 8192,
+            "max_output_tokens": max(1024, int(MAX_OUTPUT_TOKENS * share)),
         }
-    )
+    ))]
+    if fallback and fallback != primary:
+        models.append((fallback, genai.GenerativeModel(
+            fallback,
+            generation_config={
+                "temperature": 0.2,
+                "max_output_tokens": max(1024, int(MAX_OUTPUT_TOKENS * 0.75 * share)),
+            }
+        )))
+    return models
+
+
+def generate_with_gemini(pages, doc_type="cheatsheet", topic=None):
+    """
+    Generate cheatsheet from selected pages using Gemini API
+    Sends each page's extractive summary (services.compression) when present,
+    otherwise its text capped at 2500 chars
+    topic: (topic id, topic count) when the pages are one topic of a larger sheet;
+    the prompt and output budget are scaled down to that topic's share
+    Called through GeminiProvider (services.llm_providers)
+    """
+    configure_gemini()
+    
+    topic_count = topic[1] if topic else 1
+    models = build_models(share=1.0 / topic_count)
     
     # Prepare content blocks (limit text per page to avoid token overflow)
     content_blocks = []
-    for p in pages[:60]:  # Process max 60 pages per call
+    for p in pages[:MAX_PROMPT_PAGES]:
         section = p.get("section_title", "Section")
-        content_blocks.append({
+        block = {
             "page": p.get("page", 0),
             "pdf_name": p.get("pdf_name", "unknown.pdf"),
             "section": section,
-            "text": p.get("full_text", "")[:2500],  # Limit to ~2500 chars per page
-            "formulas": p.get("formulas", [])[:10],  # Limit formulas
-            "has_definition": p.get("has_definition", False)
-        })
+            # Extractive summary from services.compression if available
+            "text": p.get("summary_text", p.get("full_text", "")[:2500]),  # Limit to ~2500 chars per page
+        }
+        # Omit empty fields to keep the prompt small
+        formulas = p.get("formulas", [])[:10]  # Limit formulas
+        if formulas:
+            block["formulas"] = formulas
+        if p.get("has_definition"):
+            block["has_definition"] = True
+        content_blocks.append(block)
     
     # Create prompt based on doc_type
     if doc_type == "cheatsheet":
@@ -86,6 +139,18 @@ INCLUDE:
 - Key examples
 - Important concepts
 - Brief explanations
+"""
+
+    if topic_count > 1:
+        full_pages = 2 if doc_type == "cheatsheet" else 5
+        instructions += f"""
+SCOPE:
+This request covers ONE of {topic_count} topics of a larger document.
+The other topics are written separately and combined afterwards, so:
+- Write only the sections for the content below
+- Keep to about {full_pages / topic_count:.1f} page(s), i.e. 1/{topic_count} of the full length
+- Do not add an introduction, overview or summary section
+- Set "title" to the module name if evident from the content, otherwise "Module Cheatsheet"
 """
 
     prompt = f"""
@@ -100,7 +165,7 @@ STRICT RULES:
 4. Group related concepts under section headings
 
 Content from {len(content_blocks)} lecture pages:
-{json.dumps(content_blocks, indent=2, ensure_ascii=False)}
+{json.dumps(content_blocks, separators=(",", ":"), ensure_ascii=False)}
 
 Output Schema (STRICT):
 {{
@@ -126,10 +191,11 @@ Generate the cheatsheet now (pure JSON only):
 """
     
     try:
-        response = model.generate_content(prompt)
+        # Deadline, retries with backoff, hedging and model fallback
+        response_text, model_name = call_with_resilience(models, prompt)
         
         # Parse JSON response
-        raw_text = response.text.strip()
+        raw_text = response_text.strip()
         
         # Remove markdown code blocks if present
         if raw_text.startswith("```json"):
@@ -143,6 +209,7 @@ Generate the cheatsheet now (pure JSON only):
         
         # Use the fixing function to handle escaping issues
         result = fix_json_escaping(raw_text)
+        result["model"] = model_name
         return result
     
     except json.JSONDecodeError as e:
@@ -150,7 +217,9 @@ Generate the cheatsheet now (pure JSON only):
         error_details = {
             "error": f"Failed to parse Gemini response as JSON: {str(e)}",
             "raw_response": raw_text if 'raw_text' in locals() else None,
-            "error_position": f"line {e.lineno} column {e.colno}" if hasattr(e, 'lineno') else None
+            "error_position": f"line {e.lineno} column {e.colno}" if hasattr(e, 'lineno') else None,
+            # A new sample may parse; API errors were already retried
+            "retryable": True
         }
         print("JSON Parse Error:", error_details)  # Log to console
         return error_details
@@ -158,7 +227,7 @@ Generate the cheatsheet now (pure JSON only):
     except Exception as e:
         error_details = {
             "error": f"Gemini API error: {str(e)}",
-            "raw_response": getattr(response, 'text', None) if 'response' in locals() else None
+            "raw_response": response_text if 'response_text' in locals() else None
         }
         print("General Error:", error_details)  # Log to console
         return error_details
\ No newline at end of file
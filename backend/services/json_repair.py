@@ -0,0 +1,287 @@
+import json
+import re
+
+
+# Characters that may legally follow a backslash in a JSON string
+JSON_ESCAPES = set('"\\/bfnrtu')
+HEX_DIGITS = set("0123456789abcdefABCDEF")
+WHITESPACE = set(" \t\r\n")
+
+# What may follow a closing quote (anything else means the quote is part of the text)
+STRING_TERMINATORS = set(",:}]")
+AFTER_COMMA = set('"{[}]-0123456789')
+LITERALS = ("true", "false", "null")
+
+# LaTeX commands that start like a JSON escape (\b \f \n \r \t)
+LATEX_COMMANDS = {
+    # \b
+    "bar", "beta", "begin", "bf", "big", "bigcap", "bigcup", "bigoplus", "bigotimes",
+    "bigvee", "bigwedge", "binom", "bmod", "boldsymbol", "bot", "bowtie", "boxed",
+    "breve", "bullet",
+    # \f
+    "flat", "forall", "frac", "frown",
+    # \n
+    "nabla", "natural", "ne", "nearrow", "neg", "neq", "newline", "ngeq", "ni",
+    "nleq", "nmid", "nolimits", "nonumber", "not", "notin", "nparallel", "nsubseteq",
+    "nu", "nwarrow",
+    # \r
+    "rangle", "rbrace", "rceil", "re", "rfloor", "rho", "right", "rightarrow",
+    "rightharpoonup", "rightleftharpoons", "rm", "root",
+    # \t
+    "tan", "tanh", "tau", "text", "textbf", "textit", "textrm", "texttt", "tfrac",
+    "therefore", "theta", "tilde", "times", "to", "top", "triangle", "triangleleft",
+    "triangleq", "triangleright", "tt",
+}
+
+
+# An odd run of backslashes before b/f/n/r/t and letters, e.g. \frac but not \\frac
+ESCAPE_RUN = re.compile(r'(?<!\\)(?:\\\\)*\\([bfnrt][A-Za-z]*)')
+
+
+def _next_non_ws(text, i):
+    """Index of the next non-whitespace character at or after i (len(text) if none)"""
+    n = len(text)
+    while i < n and text[i] in WHITESPACE:
+        i += 1
+    return i
+
+
+def _is_latex_escape(text, i):
+    """
+    Decide whether the backslash at text[i] starts a LaTeX command rather
+    than a JSON escape. \\frac, \\beta, \\nabla, \\theta, \\rho, \\underline
+    all look like valid JSON escapes followed by lowercase letters.
+    """
+    n = len(text)
+    nxt = text[i + 1] if i + 1 < n else ""
+
+    if nxt not in JSON_ESCAPES:
+        return True
+    if nxt in '"\\/':
+        return False
+    if nxt == "u":
+        hex_part = text[i + 2:i + 6]
+        return len(hex_part) < 4 or not all(c in HEX_DIGITS for c in hex_part)
+
+    # \b \f \n \r \t - LaTeX only if the letters form a known command,
+    # so a real escape like "Step 1:\nthen" is left alone
+    j = i + 1
+    while j < n and text[j].isalpha():
+        j += 1
+    return text[i + 1:j] in LATEX_COMMANDS
+
+
+def _string_end(text, i):
+    """Index of the quote closing the string opened at text[i] (len(text) if none)"""
+    n = len(text)
+    i += 1
+    while i < n and text[i] != '"':
+        i += 2 if text[i] == "\\" else 1
+    return min(i, n)
+
+
+def _closes_string(text, i, container=None):
+    """
+    Decide whether the quote at text[i] terminates the current string
+    container: innermost open container ("{" or "[")
+    """
+    j = _next_non_ws(text, i + 1)
+    if j >= len(text):
+        return True
+    c = text[j]
+    if c == '"':
+        # Missing comma: `"x" "b": 1` in an object, `"a" "b"]` in an array
+        k = _next_non_ws(text, _string_end(text, j) + 1)
+        if k >= len(text):
+            return False
+        return text[k] == ":" if container == "{" else text[k] in ",]"
+    if c not in STRING_TERMINATORS:
+        return False
+    if c != ",":
+        return True
+    # `he said "hi", then ...` - a real separator is followed by a new value or key
+    k = _next_non_ws(text, j + 1)
+    if k >= len(text) or text[k] in AFTER_COMMA:
+        return True
+    return any(
+        text.startswith(lit, k) and not text[k + len(lit):k + len(lit) + 1].isalpha()
+        for lit in LITERALS
+    )
+
+
+def repair_json(text):
+    """
+    Repair model-generated JSON in a single left-to-right pass.
+
+    Handles:
+    - Leading prose / code fences before the first { or [
+    - Unescaped LaTeX backslashes inside strings (\\frac -> \\\\frac)
+    - Raw newlines/tabs and stray quotes inside strings
+    - Trailing commas and missing commas between values
+    - Truncated output (e.g. max_output_tokens hit): the text is cut back to the
+      last complete value and all open containers are closed, so every
+      finished section survives
+
+    Returns the repaired JSON text (parse with json.loads).
+    """
+    start = -1
+    for i, c in enumerate(text):
+        if c in "{[":
+            start = i
+            break
+    if start == -1:
+        return text
+
+    out = []
+    stack = []
+    in_string = False
+    is_key = False
+    expect_comma = False
+    in_scalar = False
+
+    # Last point where everything emitted so far is a complete value:
+    # (length of out, open containers at that point)
+    safe_len = 0
+    safe_stack = ()
+
+    i = start
+    n = len(text)
+
+    while i < n:
+        c = text[i]
+
+        if in_string:
+            if c == "\\":
+                if _is_latex_escape(text, i):
+                    out.append("\\\\")
+                    i += 1
+                else:
+                    out.append(text[i:i + 2])
+                    i += 2
+                continue
+            if c == '"':
+                if _closes_string(text, i, stack[-1] if stack else None):
+                    out.append('"')
+                    in_string = False
+                    expect_comma = True
+                    if not is_key:
+                        safe_len, safe_stack = len(out), tuple(stack)
+                else:
+                    out.append('\\"')
+                i += 1
+                continue
+            if c == "\n":
+                out.append("\\n")
+            elif c == "\t":
+                out.append("\\t")
+            elif c == "\r":
+                out.append("\\r")
+            elif c < " ":
+                out.append("\\u%04x" % ord(c))
+            else:
+                out.append(c)
+            i += 1
+            continue
+
+        if c in WHITESPACE:
+            in_scalar = False
+            i += 1
+            continue
+
+        if c == '"':
+            if expect_comma and stack:
+                out.append(",")
+            # In an object, a string not preceded by ':' is a key
+            is_key = bool(stack) and stack[-1] == "{" and (not out or out[-1] != ":")
+            in_string = True
+            expect_comma = False
+            out.append('"')
+        elif c in "{[":
+            if expect_comma and stack:
+                out.append(",")
+            stack.append(c)
+            out.append(c)
+            expect_comma = False
+            safe_len, safe_stack = len(out), tuple(stack)
+        elif c in "}]":
+            if not stack:
+                break  # Trailing garbage after the root value
+            # Drop trailing commas / dangling keys
+            while out and out[-1] in ",:":
+                if out[-1] == ":":
+                    _drop_dangling_key(out)
+                else:
+                    out.pop()
+            out.append("}" if stack.pop() == "{" else "]")
+            expect_comma = True
+            safe_len, safe_stack = len(out), tuple(stack)
+            if not stack:
+                break  # Root value complete
+        elif c == ",":
+            if out and out[-1] == ":":
+                _drop_dangling_key(out)
+            if out and out[-1] not in ",[{":
+                safe_len, safe_stack = len(out), tuple(stack)
+                out.append(",")
+            expect_comma = False
+        elif c == ":":
+            out.append(":")
+            expect_comma = False
+        else:
+            # Scalar literal (number, true, false, null)
+            if expect_comma and not in_scalar and stack:
+                out.append(",")
+            out.append(c)
+            expect_comma = True
+            in_scalar = True
+            i += 1
+            continue
+        in_scalar = False
+        i += 1
+
+    if in_string or stack:
+        # Truncated: roll back to the last complete value and close what was open
+        del out[safe_len:]
+        while out and out[-1] in ",:":
+            if out[-1] == ":":
+                _drop_dangling_key(out)
+            else:
+                out.pop()
+        for opener in reversed(safe_stack):
+            out.append("}" if opener == "{" else "]")
+
+    return "".join(out)
+
+
+def _drop_dangling_key(out):
+    """Remove a `"key":` with no value (and its preceding comma) from the end of out"""
+    out.pop()  # ':'
+    if out and out[-1] == '"':
+        out.pop()
+        while out and out[-1] != '"':
+            out.pop()
+        if out:
+            out.pop()  # opening quote
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def has_latex_escape(text):
+    """
+    True if text has a LaTeX command that also reads as a JSON escape
+    (\frac, \beta, \theta...): such text may parse, but to the wrong string
+    """
+    return any(m.group(1) in LATEX_COMMANDS for m in ESCAPE_RUN.finditer(text))
+
+
+def loads_repaired(text):
+    """
+    Parse text as JSON, repairing it if a plain parse fails or would
+    silently turn LaTeX commands into control characters
+    """
+    if not has_latex_escape(text):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            pass
+    return json.loads(repair_json(text))
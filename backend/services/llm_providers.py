@@ -0,0 +1,229 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+from services.parser import extract_definitions, split_sentences
+
+
+# Limit on concurrent provider calls across all requests (/generate, batch,
+# incremental updates); every call goes through generate_topics
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+_llm_slots = threading.BoundedSemaphore(LLM_CONCURRENCY)
+
+# Pages a provider uses per call (a topic must not be larger)
+MAX_PROMPT_PAGES = 60
+
+# Topics of one cheatsheet are generated in parallel; workers beyond
+# LLM_CONCURRENCY only queue for a slot, so topics of several requests share it
+_topic_pool = ThreadPoolExecutor(max_workers=4 * LLM_CONCURRENCY)
+
+
+class LLMProvider(ABC):
+    """
+    Backend that turns selected pages into cheatsheet JSON:
+    {"title": ..., "sections": [{"heading": ..., "bullets": [...]}]}
+    """
+    name = "base"
+
+    def check_ready(self):
+        """Raise ValueError if the provider cannot be used (e.g. missing API key)"""
+
+    @abstractmethod
+    def generate(self, pages, doc_type="cheatsheet", topic=None):
+        """
+        Return cheatsheet JSON for the pages, or {"error": ...}
+        ("retryable": True if a new attempt may succeed, e.g. unparseable output;
+        transient API errors should be retried inside the provider)
+        topic: (topic id, topic count) when the pages are one topic of a larger sheet
+        """
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini via google.generativeai (network + API quota)"""
+    name = "gemini"
+
+    def check_ready(self):
+        if not os.getenv("GEMINI_API_KEY"):
+            raise ValueError("Gemini API key not configured. Please set GEMINI_API_KEY in .env file")
+
+    def generate(self, pages, doc_type="cheatsheet", topic=None):
+        # Imported lazily so the local provider works without google-generativeai
+        from services.gemini_client import generate_with_gemini
+        return generate_with_gemini(pages, doc_type, topic)
+
+
+class LocalProvider(LLMProvider):
+    """
+    Deterministic offline provider: extractive summary built from the ranked
+    pages (definition sentences, lead sentences and formulas), with optional
+    canned latency (LOCAL_LLM_LATENCY seconds) to mimic a remote model.
+    Used for load tests, benchmarks and running without network.
+    """
+    name = "local"
+
+    def __init__(self, latency=None):
+        self.latency = latency if latency is not None else float(os.getenv("LOCAL_LLM_LATENCY", "0"))
+
+    def generate(self, pages, doc_type="cheatsheet", topic=None):
+        # Output is per page, so a topic's share of the sheet is already proportional
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        bullets_per_page = 2 if doc_type == "cheatsheet" else 4
+        max_chars = 240 if doc_type == "cheatsheet" else 480
+
+        # Present in document order, not ranking order
+        ordered = sorted(pages[:MAX_PROMPT_PAGES], key=lambda p: (p.get("pdf_index", 0), p.get("page", 0)))
+
+        sections = []
+        for p in ordered:
+            bullets = self._page_bullets(p, bullets_per_page, max_chars)
+            if not bullets:
+                continue
+
+            heading = p.get("section_title") or "Section"
+            if sections and sections[-1]["heading"] == heading:
+                sections[-1]["bullets"].extend(bullets)
+            else:
+                sections.append({"heading": heading, "bullets": bullets})
+
+        return {
+            "title": "Module Cheatsheet" if doc_type == "cheatsheet" else "Study Notes",
+            "sections": sections,
+            "model": self.name
+        }
+
+    def _page_bullets(self, page, limit, max_chars):
+        sentences = split_sentences(page.get("full_text", ""))
+        formulas = page.get("formulas", [])[:3]
+
+        definitions = [s for s in sentences if extract_definitions(s)]
+        picked = definitions[:limit]
+        for s in sentences:
+            if len(picked) >= limit:
+                break
+            if s not in picked:
+                picked.append(s)
+
+        bullets = []
+        for s in picked:
+            is_definition = s in definitions
+            bullets.append({
+                "text": s if len(s) <= max_chars else s[:max_chars].rsplit(" ", 1)[0] + "...",
+                "page": page.get("page", 0),
+                "formulas": [],
+                "type": "definition" if is_definition else "concept"
+            })
+
+        if formulas:
+            if bullets:
+                bullets[0]["formulas"] = formulas
+            else:
+                bullets.append({
+                    "text": page.get("section_title") or "Formulas",
+                    "page": page.get("page", 0),
+                    "formulas": formulas,
+                    "type": "formula"
+                })
+        return bullets
+
+
+PROVIDERS = {
+    "gemini": GeminiProvider,
+    "local": LocalProvider,
+}
+
+
+def get_provider(name=None):
+    """Provider by name, defaulting to LLM_PROVIDER (gemini)"""
+    name = (name or os.getenv("LLM_PROVIDER", "gemini")).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider: {name}. Use one of: {', '.join(PROVIDERS)}")
+    return PROVIDERS[name]()
+
+
+def source_pages(pages):
+    """[pdf_index, page] references for a list of pages"""
+    return [[p.get("pdf_index", 0), p.get("page", 0)] for p in pages]
+
+
+def generate_topics(topics, doc_type, provider, topic_ids=None, topic_count=None):
+    """
+    Prompt each topic (list of pages) separately, in parallel; topics that
+    fail with a retryable error (e.g. unparseable output) are retried once
+    Every returned section is tagged with its topic id (topic_ids, default
+    0..n-1) and source pages
+    topic_count: topics in the whole sheet (default len(topics)), used to
+    size each topic's share of the output
+    Returns one result dict per topic (may contain "error" and "topic")
+    """
+    topic_ids = topic_ids or list(range(len(topics)))
+    topic_count = topic_count or len(topics)
+
+    def run(item):
+        idx, topic = item
+        try:
+            with _llm_slots:
+                return provider.generate(topic, doc_type, (idx, topic_count))
+        except Exception as e:
+            return {"error": str(e)}
+
+    def run_all(items):
+        if len(items) == 1:
+            return [run(items[0])]
+        return list(_topic_pool.map(run, items))
+
+    items = list(zip(topic_ids, topics))
+    results = run_all(items)
+
+    failed = [i for i, r in enumerate(results) if "error" in r and r.get("retryable")]
+    if failed:
+        for i, result in zip(failed, run_all([items[i] for i in failed])):
+            results[i] = result
+
+    for idx, topic, result in zip(topic_ids, topics, results):
+        result["topic"] = idx
+        refs = source_pages(topic)
+        for section in result.get("sections", []):
+            section["topic"] = idx
+            section["source_pages"] = refs
+    return results
+
+
+def merge_topic_results(results):
+    """
+    Assemble per-topic results into one cheatsheet, keeping successful topics
+    Failed topics are listed in "failed_topics"/"topic_errors" so callers can
+    report a partial result
+    """
+    ok = [r for r in results if "error" not in r]
+    if not ok:
+        return results[0] if results else {"error": "No content to generate from"}
+
+    merged = {
+        "title": ok[0].get("title", "Module Cheatsheet"),
+        "sections": [s for r in ok for s in r.get("sections", [])],
+    }
+    if ok[0].get("model"):
+        merged["model"] = ok[0]["model"]
+
+    failed = [r for r in results if "error" in r]
+    if failed:
+        merged["failed_topics"] = [r["topic"] for r in failed]
+        merged["topic_errors"] = [r["error"] for r in failed]
+        print(f"Topics failed: {merged['failed_topics']}: {merged['topic_errors']}")
+    return merged
+
+
+def generate_cheatsheet(pages, doc_type="cheatsheet", provider=None, topics=None):
+    """
+    Generate cheatsheet from selected pages through the configured provider
+    provider: LLMProvider instance, provider name, or None for LLM_PROVIDER
+    topics: optional grouping of the pages (services.clustering); each topic
+    is prompted separately and the results assembled as sections
+    """
+    if not isinstance(provider, LLMProvider):
+        provider = get_provider(provider)
+    return merge_topic_results(generate_topics(topics or [pages], doc_type, provider))
@@ -0,0 +1,192 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+# Shared pool for model calls. Each call also gets a client-side timeout
+# (request_options), so a hung request gives its worker back at the deadline
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_MAX_WORKERS", "8")))
+
+
+class LLMCallError(Exception):
+    """All attempts (including fallbacks) failed"""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+# Error types worth retrying (google.api_core.exceptions names, matched by
+# name so this module does not depend on the client library)
+TRANSIENT_ERROR_NAMES = {
+    "DeadlineExceeded", "InternalServerError", "ResourceExhausted",
+    "ServiceUnavailable", "TooManyRequests", "GatewayTimeout", "ServerError",
+}
+
+
+def is_transient(error):
+    """Timeouts, connection errors, 429 and 5xx are retried; anything else is not"""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__):
+        return True
+    code = getattr(error, "code", None)
+    return isinstance(code, int) and (code == 429 or 500 <= code < 600)
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies (seconds)"""
+
+    def __init__(self, window=100):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct, min_samples=5):
+        """Latency at the given percentile, or None until enough samples exist"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < min_samples:
+            return None
+        idx = min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))
+        return samples[idx]
+
+
+class RetryPolicy:
+    """Deadline, retry and hedging settings for one logical LLM call"""
+
+    def __init__(
+        self,
+        timeout=None,
+        total_timeout=None,
+        max_attempts=None,
+        base_delay=None,
+        max_delay=None,
+        hedge_percentile=None,
+    ):
+        self.timeout = timeout if timeout is not None else float(os.getenv("LLM_CALL_TIMEOUT", "90"))
+        # Budget for all attempts, backoff and fallbacks together
+        self.total_timeout = total_timeout if total_timeout is not None else float(os.getenv("LLM_TOTAL_TIMEOUT", "180"))
+        self.max_attempts = max_attempts if max_attempts is not None else int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+        self.base_delay = base_delay if base_delay is not None else float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+        self.max_delay = max_delay if max_delay is not None else float(os.getenv("LLM_BACKOFF_MAX", "20"))
+        # Percentile of observed latency after which a duplicate (paid) request
+        # is sent; 0 = off (default)
+        self.hedge_percentile = (
+            hedge_percentile if hedge_percentile is not None
+            else float(os.getenv("LLM_HEDGE_PERCENTILE", "0"))
+        )
+
+    def backoff(self, attempt):
+        """Exponential backoff with full jitter"""
+        cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(0, cap)
+
+
+# Latency history per model name, shared across requests
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def get_tracker(name):
+    with _trackers_lock:
+        if name not in _trackers:
+            _trackers[name] = LatencyTracker()
+        return _trackers[name]
+
+
+def _timed_call(model, prompt, timeout):
+    started = time.monotonic()
+    response = model.generate_content(prompt, request_options={"timeout": timeout})
+    text = response.text  # Raises if the response was blocked/empty
+    return text, time.monotonic() - started
+
+
+def _attempt(model, prompt, policy, tracker, timeout):
+    """
+    One attempt with a deadline. If the primary request is slower than the
+    tracker's hedge percentile, a duplicate is sent and the first success wins.
+    Returns response text or raises.
+    """
+    deadline = time.monotonic() + timeout
+    futures = [_executor.submit(_timed_call, model, prompt, timeout)]
+
+    hedge_after = None
+    if policy.hedge_percentile > 0:
+        hedge_after = tracker.percentile(policy.hedge_percentile)
+
+    if hedge_after is not None and hedge_after < timeout:
+        done, _ = wait(futures, timeout=hedge_after)
+        if not done:
+            futures.append(_executor.submit(_timed_call, model, prompt, timeout - hedge_after))
+
+    last_error = None
+    pending = set(futures)
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for f in done:
+            try:
+                text, elapsed = f.result()
+            except Exception as e:
+                last_error = e
+                continue
+            tracker.record(elapsed)
+            return text
+
+    if last_error is not None and not pending:
+        raise last_error
+    raise TimeoutError(f"LLM call exceeded {timeout:g}s deadline")
+
+
+def call_with_resilience(models, prompt, policy=None, sleep=time.sleep):
+    """
+    Call model.generate_content(prompt) with per-call deadlines, exponential
+    backoff with jitter and optional hedged duplicates, falling through `models`
+    in order (e.g. primary then a cheaper fallback config).
+
+    Only transient errors (see is_transient) are retried or fall through to the
+    next model; anything else (safety block, bad key, 4xx) is raised at once.
+    Everything, including backoff, stays within policy.total_timeout, which is
+    shared out so every model gets a turn: each model may use an equal share
+    of the budget left when it starts.
+
+    models: list of (name, model) pairs; any object with
+    generate_content(prompt, request_options={"timeout": seconds}) works
+    (the genai.GenerativeModel signature), so a local fake model can be
+    injected for testing.
+    Returns (response_text, model_name).
+    """
+    policy = policy or RetryPolicy()
+    deadline = time.monotonic() + policy.total_timeout
+    errors = []
+
+    for position, (name, model) in enumerate(models):
+        tracker = get_tracker(name)
+        # A hanging primary must not use up the budget of the fallbacks
+        model_deadline = time.monotonic() + (deadline - time.monotonic()) / (len(models) - position)
+        for attempt in range(policy.max_attempts):
+            remaining = model_deadline - time.monotonic()
+            if remaining <= 0:
+                errors.append(f"{name}: share of the {policy.total_timeout:g}s deadline used up")
+                break
+            try:
+                return _attempt(model, prompt, policy, tracker, min(policy.timeout, remaining)), name
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                errors.append(f"{name} attempt {attempt + 1}: {e}")
+                print(f"LLM call failed ({name}, attempt {attempt + 1}/{policy.max_attempts}): {e}")
+                if attempt + 1 < policy.max_attempts:
+                    sleep(min(policy.backoff(attempt), max(0, model_deadline - time.monotonic())))
+
+    raise LLMCallError("All LLM attempts failed: " + "; ".join(errors), errors)
+
@@ -55,6 +55,17 @@ def extract_definitions(text):
     return False
 
 
+def split_sentences(text):
+    """Split page text into sentences"""
+    if not text:
+        return []
+    
+    # Break after . ! ? followed by whitespace and an uppercase letter/digit/$,
+    # at newlines, and at slide bullet markers
+    parts = re.split(r'(?<=[.!?])\s+(?=[A-Z0-9$\\(])|\n+|\s*[•▪●◦‣]\s*', text)
+    return [s.strip() for s in parts if s.strip()]
+
+
 def parse_pdf_to_pages(pdf_path: str):
     """
     Parse PDF and extract structured content per page
@@ -2,7 +2,35 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 import numpy as np
 
 
-def rank_pages_by_importance(all_pages):
+def build_vectorizer():
+    """TF-IDF vectorizer shared by ranking and compression"""
+    return TfidfVectorizer(
+        max_features=100,
+        stop_words='english',
+        ngram_range=(1, 2),
+        max_df=0.85,
+        min_df=1
+    )
+
+
+def fit_page_vectorizer(all_pages):
+    """
+    Fit the TF-IDF vectorizer on page texts
+    Returns None if there is no usable text (callers fall back)
+    """
+    texts = [p.get("full_text", "") for p in all_pages]
+    texts = [t for t in texts if t.strip()]
+    if not texts:
+        return None
+    
+    try:
+        return build_vectorizer().fit(texts)
+    except Exception as e:
+        print(f"TF-IDF fit failed: {e}")
+        return None
+
+
+def rank_pages_by_importance(all_pages, vectorizer=None):
     """
     Rank pages by composite score:
     - TF-IDF importance
@@ -10,6 +38,9 @@ def rank_pages_by_importance(all_pages):
     - Definition presence
     - Heading count
     
+    vectorizer: already fitted TF-IDF vectorizer (see fit_page_vectorizer)
+    to reuse; fitted on these pages if None
+    
     Returns: sorted list of pages with importance scores
     """
     if not all_pages:
@@ -27,15 +58,10 @@ def rank_pages_by_importance(all_pages):
     
     # TF-IDF scoring
     try:
-        vectorizer = TfidfVectorizer(
-            max_features=100,
-            stop_words='english',
-            ngram_range=(1, 2),
-            max_df=0.85,
-            min_df=1
-        )
-        
-        tfidf_matrix = vectorizer.fit_transform(valid_texts)
+        if vectorizer is not None:
+            tfidf_matrix = vectorizer.transform(valid_texts)
+        else:
+            tfidf_matrix = build_vectorizer().fit_transform(valid_texts)
         # Sum TF-IDF scores per document
         tfidf_scores = np.array(tfidf_matrix.sum(axis=1)).flatten()
         
@@ -49,10 +75,11 @@ def rank_pages_by_importance(all_pages):
     # Calculate composite scores for all pages
     ranked_pages = []
     tfidf_idx = 0
+    valid_set = set(valid_indices)
     
     for i, page in enumerate(all_pages):
         # Get TF-IDF score if page was valid
-        if i in valid_indices:
+        if i in valid_set:
             tfidf_score = tfidf_scores[tfidf_idx]
             tfidf_idx += 1
         else:
@@ -0,0 +1,322 @@
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+
+class JobNotFoundError(Exception):
+    """Job directory does not exist (never created, expired or evicted)"""
+
+
+class StorageManager:
+    """
+    Lifecycle of job files under storage/:
+    - uploads/<job_id>_<NN>_<name>.pdf  raw uploads, deleted once parsed
+    - parsed/<job_id>/pdf_NN.json       parsed pages, gzipped when cold
+
+    Jobs expire after a TTL since last access, and the least recently used
+    jobs are evicted when total usage exceeds the byte quota.
+    The job directory mtime is the last-access time.
+    """
+
+    def __init__(self, upload_dir, parsed_dir, ttl_seconds=None, quota_bytes=None, cold_after=None):
+        self.upload_dir = upload_dir
+        self.parsed_dir = parsed_dir
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("STORAGE_TTL_HOURS", "72")) * 3600
+        self.quota_bytes = quota_bytes if quota_bytes is not None else int(float(os.getenv("STORAGE_QUOTA_MB", "2048")) * 1024 * 1024)
+        self.cold_after = cold_after if cold_after is not None else float(os.getenv("STORAGE_COLD_MINUTES", "60")) * 60
+
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._active = {}  # job_id -> number of requests using it
+        self._maintaining = set()  # job_ids claimed by maintenance
+        self._writers = {}  # job_id -> [asyncio.Lock, requests holding or waiting]
+        self._usage = {"total_bytes": 0, "jobs": 0, "last_maintenance": None}
+
+        os.makedirs(upload_dir, exist_ok=True)
+        os.makedirs(parsed_dir, exist_ok=True)
+
+    # ---- Job access ----
+
+    def job_dir(self, job_id):
+        return os.path.join(self.parsed_dir, job_id)
+
+    def touch(self, job_id):
+        """Mark job as recently used (for TTL and LRU)"""
+        try:
+            os.utime(self.job_dir(job_id))
+        except FileNotFoundError:
+            pass
+
+    def _acquire(self, job_id, create=False):
+        """
+        Register a request on a job (blocking): waits for a running compaction
+        of the job to finish, then raises JobNotFoundError if the job no longer
+        exists (create=True makes it)
+        """
+        with self._cond:
+            while job_id in self._maintaining:
+                self._cond.wait()
+            self._active[job_id] = self._active.get(job_id, 0) + 1
+        try:
+            if create:
+                os.makedirs(self.job_dir(job_id), exist_ok=True)
+            elif not os.path.isdir(self.job_dir(job_id)):
+                raise JobNotFoundError(job_id)
+        except BaseException:
+            self._release(job_id)
+            raise
+
+    def _release(self, job_id):
+        with self._cond:
+            self._active[job_id] -= 1
+            if not self._active[job_id]:
+                del self._active[job_id]
+        self.touch(job_id)
+
+    @contextmanager
+    def in_use(self, job_id, create=False):
+        """Protect a job from compaction/eviction while a request works on it"""
+        self._acquire(job_id, create)
+        try:
+            yield
+        finally:
+            self._release(job_id)
+
+    @asynccontextmanager
+    async def using(self, job_id, create=False, exclusive=False):
+        """
+        in_use for async handlers: waiting for a compaction of the job runs
+        in a worker thread, so the event loop keeps serving other requests
+        exclusive: one such request per job at a time, for requests that
+        change the job's files or cheatsheet
+        """
+        if not exclusive:
+            async with self._using(job_id, create):
+                yield
+            return
+
+        writer = self._writers.setdefault(job_id, [asyncio.Lock(), 0])
+        writer[1] += 1
+        try:
+            async with writer[0]:
+                async with self._using(job_id, create):
+                    yield
+        finally:
+            writer[1] -= 1
+            if not writer[1]:
+                del self._writers[job_id]
+
+    @asynccontextmanager
+    async def _using(self, job_id, create):
+        acquired = asyncio.get_running_loop().run_in_executor(None, self._acquire, job_id, create)
+        try:
+            await asyncio.shield(acquired)
+        except asyncio.CancelledError:
+            # The wait finishes anyway; give the job back once it has
+            def release(future):
+                if not future.cancelled() and future.exception() is None:
+                    self._release(job_id)
+            acquired.add_done_callback(release)
+            raise
+        try:
+            yield
+        finally:
+            self._release(job_id)
+
+    @contextmanager
+    def _claim(self, job_id):
+        """
+        Claim a job for maintenance unless a request is using it
+        Yields False (and claims nothing) if the job is in use
+        """
+        with self._cond:
+            if job_id in self._active:
+                claimed = False
+            else:
+                self._maintaining.add(job_id)
+                claimed = True
+        try:
+            yield claimed
+        finally:
+            if claimed:
+                with self._cond:
+                    self._maintaining.discard(job_id)
+                    self._cond.notify_all()
+
+    # ---- Parsed data ----
+
+    def parsed_files(self, job_id):
+        """Parsed PDF files for a job in order (plain or gzipped)"""
+        names = [
+            f for f in os.listdir(self.job_dir(job_id))
+            if f.startswith("pdf_") and (f.endswith(".json") or f.endswith(".json.gz"))
+        ]
+        return sorted(names)
+
+    def next_pdf_index(self, job_id):
+        """Index for the next PDF added to a job (pdf_NN.json)"""
+        indices = [int(name.split(".")[0][4:]) for name in self.parsed_files(job_id)]
+        return max(indices, default=-1) + 1
+
+    def load_json(self, path):
+        if path.endswith(".gz"):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                return json.load(f)
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def write_json(self, path, data):
+        """Write compact JSON (parsed data is machine-read only)"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+    # ---- Maintenance ----
+
+    def _upload_paths(self):
+        """Raw uploads grouped by job_id"""
+        by_job = {}
+        with os.scandir(self.upload_dir) as it:
+            for entry in it:
+                if entry.is_file():
+                    # uuid4 job ids are 36 characters
+                    by_job.setdefault(entry.name[:36], []).append(entry.path)
+        return by_job
+
+    def _dir_bytes(self, path):
+        total = 0
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_file():
+                    total += entry.stat().st_size
+        return total
+
+    def job_bytes(self, job_id):
+        try:
+            return self._dir_bytes(self.job_dir(job_id))
+        except FileNotFoundError:
+            return 0
+
+    def delete_job(self, job_id, uploads=None):
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+        for path in uploads or []:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def compact_job(self, job_id, uploads, now):
+        """Delete raw uploads and gzip parsed data of cold jobs"""
+        job_dir = self.job_dir(job_id)
+        last_access = os.stat(job_dir).st_mtime
+
+        # Raw PDFs are only needed while /parse runs
+        for path in uploads:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+        if now - last_access < self.cold_after:
+            return
+
+        for name in self.parsed_files(job_id):
+            if name.endswith(".gz"):
+                continue
+            src = os.path.join(job_dir, name)
+            with open(src, "rb") as f_in, gzip.open(src + ".gz", "wb") as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            os.remove(src)
+
+        # Compaction must not count as an access
+        os.utime(job_dir, (last_access, last_access))
+
+    def run_maintenance(self):
+        """
+        One maintenance pass: expire TTL'd jobs, compact the rest,
+        then evict least recently used jobs until under quota
+        """
+        now = time.time()
+        uploads = self._upload_paths()
+
+        jobs = []  # (last_access, job_id)
+        with os.scandir(self.parsed_dir) as it:
+            for entry in it:
+                if entry.is_dir():
+                    jobs.append((entry.stat().st_mtime, entry.name))
+
+        # Each job is claimed for the whole check-and-modify step, so a
+        # request cannot start using it halfway through
+        kept = []
+        for last_access, job_id in jobs:
+            job_uploads = uploads.pop(job_id, [])
+            with self._claim(job_id) as claimed:
+                if not claimed:
+                    kept.append((last_access, job_id, self.job_bytes(job_id) + self._files_bytes(job_uploads)))
+                    continue
+                try:
+                    # Re-read under the claim: a request may have just finished
+                    last_access = os.stat(self.job_dir(job_id)).st_mtime
+                except FileNotFoundError:
+                    continue
+                if now - last_access > self.ttl_seconds:
+                    self.delete_job(job_id, job_uploads)
+                    continue
+                try:
+                    self.compact_job(job_id, job_uploads, now)
+                except Exception as e:
+                    print(f"Compaction failed for {job_id}: {e}")
+                kept.append((last_access, job_id, self.job_bytes(job_id)))
+
+        # Uploads without a job directory are leftovers of failed parses
+        for job_id, paths in uploads.items():
+            with self._claim(job_id) as claimed:
+                if claimed and not os.path.isdir(self.job_dir(job_id)):
+                    self.delete_job(job_id, paths)
+
+        total = sum(b for _, _, b in kept)
+        remaining = len(kept)
+        kept.sort()  # Oldest access first
+        for last_access, job_id, size in kept:
+            if total <= self.quota_bytes:
+                break
+            with self._claim(job_id) as claimed:
+                if not claimed or self._last_access(job_id) > last_access:
+                    continue  # In use, or used since the scan
+                self.delete_job(job_id)
+            total -= size
+            remaining -= 1
+
+        with self._lock:
+            self._usage = {
+                "total_bytes": total,
+                "jobs": remaining,
+                "last_maintenance": now
+            }
+
+    def _last_access(self, job_id):
+        try:
+            return os.stat(self.job_dir(job_id)).st_mtime
+        except FileNotFoundError:
+            return 0
+
+    def _files_bytes(self, paths):
+        total = 0
+        for path in paths:
+            try:
+                total += os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+        return total
+
+    def usage(self):
+        """Storage usage from the last maintenance pass"""
+        with self._lock:
+            usage = dict(self._usage)
+        usage["quota_bytes"] = self.quota_bytes
+        usage["ttl_seconds"] = self.ttl_seconds
+        return usage
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the backend the same way main.py does (from services...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """main.app on temporary storage with the offline local provider"""
+    from fastapi.testclient import TestClient
+
+    monkeypatch.chdir(tmp_path)  # main creates its storage dirs on import
+    monkeypatch.setenv("LLM_PROVIDER", "local")
+    import main
+    from services.storage import StorageManager
+
+    upload_dir, parsed_dir = str(tmp_path / "uploads"), str(tmp_path / "parsed")
+    monkeypatch.setattr(main, "storage", StorageManager(upload_dir, parsed_dir))
+    monkeypatch.setattr(main, "UPLOAD_DIR", upload_dir)
+    monkeypatch.setattr(main, "PARSED_DIR", parsed_dir)
+    return TestClient(main.app)
+
+
+def make_pdf(pages):
+    """PDF bytes with one page per (title, [lines]) pair"""
+    import fitz
+
+    doc = fitz.open()
+    for title, lines in pages:
+        page = doc.new_page()
+        page.insert_text((72, 72), title, fontsize=18)
+        for i, line in enumerate(lines):
+            page.insert_text((72, 110 + 14 * i), line, fontsize=10)
+    return doc.tobytes()
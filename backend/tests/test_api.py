@@ -0,0 +1,165 @@
+import os
+
+from conftest import make_pdf
+from services.llm_providers import LocalProvider
+
+
+ENTROPY = [(f"Entropy {i}", ["Entropy is defined as the expected information content.",
+                             "Channel capacity bounds the rate."]) for i in range(3)]
+SORTING = [(f"Sorting {i}", ["A heap is called a complete binary tree.",
+                             "Quicksort partitions the array around a pivot."]) for i in range(3)]
+
+
+def parse(api, *pdfs, **data):
+    files = [("files", (f"doc{i}.pdf", make_pdf(pages), "application/pdf")) for i, pages in enumerate(pdfs)]
+    response = api.post("/parse", files=files, data=data)
+    assert response.status_code == 200, response.text
+    return response.json()["job_id"]
+
+
+def test_unknown_provider_is_a_client_error(api):
+    job_id = parse(api, ENTROPY)
+    response = api.post("/generate", data={"job_id": job_id, "provider": "nope"})
+    assert response.status_code == 400
+    assert "Unknown LLM provider" in response.json()["detail"]
+
+
+def test_unusable_provider_is_a_server_error(api, monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    job_id = parse(api, ENTROPY)
+    response = api.post("/generate", data={"job_id": job_id, "provider": "gemini"})
+    assert response.status_code == 500
+
+
+def test_batch_groups_courses_and_reports_missing_jobs(api):
+    first = parse(api, ENTROPY, course_id="info")
+    second = parse(api, SORTING, course_id="info")
+    alone = parse(api, SORTING)
+
+    response = api.post("/generate/batch", data={"job_ids": [first, "missing", second, alone, first]})
+    assert response.status_code == 200
+    body = response.json()
+
+    assert body["status"] == "partial"
+    assert body["jobs_total"] == 4
+    assert body["jobs_succeeded"] == 3
+    assert body["course_groups"] == 2
+    assert [j["job_id"] for j in body["jobs"]] == [first, "missing", second, alone]
+    assert body["jobs"][1] == {"job_id": "missing", "status": "error", "error": "Job not found"}
+    assert all(j["status"] == "success" and j["sections_generated"] for j in body["jobs"] if j["job_id"] != "missing")
+    assert api.get(f"/download/{alone}", params={"format": "json"}).status_code == 200
+
+
+def test_batch_of_existing_jobs_succeeds(api):
+    jobs = [parse(api, ENTROPY), parse(api, SORTING)]
+    body = api.post("/generate/batch", data={"job_ids": jobs}).json()
+    assert body["status"] == "success"
+    assert body["jobs_succeeded"] == 2
+
+
+def append(api, job_id, pages):
+    files = [("files", ("extra.pdf", make_pdf(pages), "application/pdf"))]
+    return api.post(f"/jobs/{job_id}/files", files=files)
+
+
+def topics_of(preview):
+    """{topic: sorted pdf indices of its source pages}"""
+    topics = {}
+    for s in preview["sections"]:
+        topics.setdefault(s["topic"], set()).update(ref[0] for ref in s["source_pages"])
+    return {t: sorted(pdfs) for t, pdfs in topics.items()}
+
+
+def generated_job(api, monkeypatch, *pdfs):
+    """Job with one topic per PDF (3 pages each), cheatsheet generated"""
+    monkeypatch.setenv("TOPIC_PAGES", "3")
+    job_id = parse(api, *pdfs)
+    response = api.post("/generate", data={"job_id": job_id})
+    assert response.status_code == 200, response.text
+    return job_id
+
+
+def test_append_without_cheatsheet_only_parses(api):
+    job_id = parse(api, ENTROPY)
+    response = append(api, job_id, SORTING)
+    assert response.status_code == 200
+    assert response.json()["status"] == "parsed"
+    assert response.json()["pdfs"][0]["pdf_index"] == 1
+    assert api.get(f"/status/{job_id}").json()["generated"] is False
+
+
+def test_append_joins_similar_topic_and_adds_new_ones(api, monkeypatch):
+    job_id = generated_job(api, monkeypatch, ENTROPY, SORTING)
+    assert topics_of(api.get(f"/download/{job_id}", params={"format": "json"}).json()) == {0: [0], 1: [1]}
+
+    more_entropy = [(f"More entropy {i}", ENTROPY[0][1]) for i in range(2)]
+    body = append(api, job_id, more_entropy).json()
+    assert body["status"] == "success"
+    assert body["topics_regenerated"] == 1 and body["topics_generated"] == 0
+    assert topics_of(body["preview"]) == {0: [0, 2], 1: [1]}
+
+    graphs = [(f"Graphs {i}", ["Dijkstra finds shortest paths in weighted graphs.",
+                               "A spanning tree connects every vertex."]) for i in range(2)]
+    body = append(api, job_id, graphs).json()
+    assert body["topics_regenerated"] == 0 and body["topics_generated"] == 1
+    assert topics_of(body["preview"]) == {0: [0, 2], 1: [1], 2: [3]}
+
+
+def test_append_rolls_back_when_generation_fails(api, monkeypatch):
+    import main
+
+    job_id = generated_job(api, monkeypatch, ENTROPY, SORTING)
+    before_files = sorted(os.listdir(main.storage.job_dir(job_id)))
+    before_sheet = api.get(f"/download/{job_id}", params={"format": "json"}).json()
+
+    def fail(self, pages, doc_type="cheatsheet", topic=None):
+        raise RuntimeError("provider down")
+    monkeypatch.setattr(LocalProvider, "generate", fail)
+
+    response = append(api, job_id, ENTROPY)
+    assert response.status_code == 500
+    assert "provider down" in response.json()["detail"]
+    assert sorted(os.listdir(main.storage.job_dir(job_id))) == before_files
+    assert api.get(f"/download/{job_id}", params={"format": "json"}).json() == before_sheet
+    assert not [n for n in os.listdir(main.UPLOAD_DIR) if n.startswith(f"{job_id}_02_")]
+
+
+def test_remove_pdf_drops_its_topic(api, monkeypatch):
+    job_id = generated_job(api, monkeypatch, ENTROPY, SORTING)
+
+    body = api.delete(f"/jobs/{job_id}/files/1").json()
+    assert body["status"] == "success"
+    assert body["topics_dropped"] == 1 and body["topics_regenerated"] == 0
+    assert topics_of(body["preview"]) == {0: [0]}
+    assert api.delete(f"/jobs/{job_id}/files/1").status_code == 404
+
+
+def test_remove_pdf_shrinks_shared_topic(api, monkeypatch):
+    job_id = generated_job(api, monkeypatch, ENTROPY, SORTING)
+    append(api, job_id, [(f"More entropy {i}", ENTROPY[0][1]) for i in range(2)])
+
+    body = api.delete(f"/jobs/{job_id}/files/2").json()
+    assert body["status"] == "success"
+    assert body["topics_regenerated"] == 1 and body["topics_dropped"] == 0
+    assert topics_of(body["preview"]) == {0: [0], 1: [1]}
+
+
+def test_remove_keeps_failed_topic_and_reports_partial(api, monkeypatch):
+    job_id = generated_job(api, monkeypatch, ENTROPY, SORTING)
+    mixed = [("More entropy", ENTROPY[0][1]), ("More sorting", SORTING[0][1])]
+    assert topics_of(append(api, job_id, mixed).json()["preview"]) == {0: [0, 2], 1: [1, 2]}
+
+    generate = LocalProvider.generate
+
+    def fail_sorting(self, pages, doc_type="cheatsheet", topic=None):
+        if any("Sorting" in p.get("full_text", "") for p in pages):
+            return {"error": "blocked"}
+        return generate(self, pages, doc_type, topic)
+    monkeypatch.setattr(LocalProvider, "generate", fail_sorting)
+
+    body = api.delete(f"/jobs/{job_id}/files/2").json()
+    assert body["status"] == "partial"
+    assert body["failed_topics"] == [1]
+    assert body["topic_errors"] == ["blocked"]
+    # Old sections of the failed topic stay, without references to the removed PDF
+    assert topics_of(body["preview"]) == {0: [0], 1: [1]}
@@ -0,0 +1,78 @@
+from services.clustering import assign_to_topics, cluster_pages
+from services.ranking import fit_page_vectorizer
+
+
+def _page(pdf_index, page, text):
+    return {"pdf_index": pdf_index, "page": page, "full_text": text}
+
+
+SORTING = [_page(0, i, "Quicksort partitions the array around a pivot, mergesort merges sorted halves") for i in range(3)]
+ENTROPY = [_page(1, i, "Entropy measures information content, Huffman coding builds optimal prefix codes") for i in range(3)]
+
+
+def test_page_joins_nearest_topic():
+    new = [_page(2, 0, "Quicksort picks a pivot and partitions the array"), _page(2, 1, "Huffman prefix codes and entropy")]
+    vectorizer = fit_page_vectorizer(SORTING + ENTROPY + new)
+
+    assigned, unassigned = assign_to_topics(new, {3: SORTING, 7: ENTROPY}, vectorizer)
+
+    assert assigned == {3: [new[0]], 7: [new[1]]}
+    assert unassigned == []
+
+
+def test_unrelated_page_is_left_unassigned():
+    new = [_page(2, 0, "Photosynthesis converts sunlight into chemical energy in chloroplasts")]
+    vectorizer = fit_page_vectorizer(SORTING + ENTROPY + new)
+
+    assigned, unassigned = assign_to_topics(new, {0: SORTING, 1: ENTROPY}, vectorizer)
+
+    assert assigned == {}
+    assert unassigned == new
+
+
+def test_full_topic_takes_no_more_pages():
+    new = [_page(2, i, "Quicksort picks a pivot and partitions the array") for i in range(3)]
+    vectorizer = fit_page_vectorizer(SORTING + ENTROPY + new)
+
+    assigned, unassigned = assign_to_topics(new, {0: SORTING, 1: ENTROPY}, vectorizer, max_pages=4)
+
+    assert assigned == {0: new[:1]}
+    assert unassigned == new[1:]
+
+
+def _interleaved():
+    # Sorting and entropy pages alternate through the document
+    return [
+        _page(0, i, SORTING[0]["full_text"] if i % 2 == 0 else ENTROPY[0]["full_text"])
+        for i in range(8)
+    ]
+
+
+def test_kmeans_groups_similar_pages():
+    pages = _interleaved()
+    topics = cluster_pages(pages, fit_page_vectorizer(pages), pages_per_topic=4)
+
+    assert [[p["page"] for p in t] for t in topics] == [[0, 2, 4, 6], [1, 3, 5, 7]]
+
+
+def test_topics_and_pages_are_in_document_order():
+    pages = _interleaved()
+    shuffled = pages[5:] + pages[:5]
+    topics = cluster_pages(shuffled, fit_page_vectorizer(pages), pages_per_topic=4)
+
+    assert [t[0]["page"] for t in topics] == [0, 1]
+    for topic in topics:
+        assert topic == sorted(topic, key=lambda p: p["page"])
+
+
+def test_without_vectorizer_falls_back_to_consecutive_chunks():
+    pages = _interleaved()
+    topics = cluster_pages(pages[::-1], None, pages_per_topic=3)
+
+    assert [[p["page"] for p in t] for t in topics] == [[0, 1, 2], [3, 4, 5], [6, 7]]
+
+
+def test_topic_count_is_capped():
+    pages = _interleaved()
+    assert len(cluster_pages(pages, None, pages_per_topic=1, max_topics=3)) == 3
+    assert cluster_pages(pages[:2], None, pages_per_topic=4) == [pages[:2]]
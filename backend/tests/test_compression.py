@@ -0,0 +1,61 @@
+from services.compression import compress_pages
+from services.ranking import fit_page_vectorizer
+
+
+SLIDE = " ".join(
+    f"Key idea {i} about caching layers and eviction policies in distributed storage systems"
+    for i in range(22)
+)  # ~1850 chars of bullet-style text with no sentence punctuation
+
+
+def test_slide_text_without_punctuation_is_not_wiped():
+    pages = [{"page": 0, "full_text": SLIDE, "formulas": []}]
+    assert len(SLIDE) > 1800
+
+    compress_pages(pages, fit_page_vectorizer(pages), max_chars=1200)
+
+    summary = pages[0]["summary_text"]
+    assert 1000 < len(summary) <= 1200
+    assert SLIDE.startswith(summary)
+
+
+def test_bullet_markers_split_into_sentences():
+    text = " ".join(f"• Point {i} covers replication lag and quorum reads in detail" for i in range(40))
+    pages = [{"page": 0, "full_text": text, "formulas": []}]
+
+    compress_pages(pages, fit_page_vectorizer(pages), max_chars=600)
+
+    summary = pages[0]["summary_text"]
+    assert 400 < len(summary) <= 600
+    assert "Point" in summary
+
+
+def test_formula_and_definition_sentences_kept_verbatim():
+    filler = " ".join(f"Filler sentence number {i} talks about nothing much." for i in range(60))
+    definition = "Entropy is defined as the expected information."
+    formula = "We have $H = -\\sum p \\log p$ here."
+    pages = [{
+        "page": 0,
+        "full_text": f"{filler} {definition} {formula}",
+        "formulas": ["$H = -\\sum p \\log p$"],
+    }]
+
+    compress_pages(pages, fit_page_vectorizer(pages), max_chars=400)
+
+    summary = pages[0]["summary_text"]
+    assert definition in summary
+    assert formula in summary
+    assert len(summary) <= 800
+
+
+def test_short_pages_are_unchanged():
+    pages = [{"page": 0, "full_text": "Intro text.", "formulas": []}]
+    compress_pages(pages, None)
+    assert pages[0]["summary_text"] == "Intro text."
+
+
+def test_no_vectorizer_falls_back_to_lead_sentences():
+    text = " ".join(f"Sentence {i} is here." for i in range(200))
+    pages = [{"page": 0, "full_text": text, "formulas": []}]
+    compress_pages(pages, None, max_chars=100)
+    assert pages[0]["summary_text"].startswith("Sentence 0 is here.")
@@ -0,0 +1,90 @@
+import json
+
+from services.json_repair import has_latex_escape, loads_repaired, repair_json
+
+
+def repaired(text):
+    return json.loads(repair_json(text))
+
+
+def test_valid_json_is_unchanged():
+    text = '{"title": "T", "sections": [{"heading": "A", "bullets": []}]}'
+    assert repaired(text) == json.loads(text)
+
+
+def test_latex_backslashes_are_escaped():
+    text = r'{"f": ["$\frac{a}{b}$", "\beta + \nabla \theta \rho", "\alpha \[x\]", "\underline{y}"]}'
+    assert repaired(text)["f"] == [
+        r"$\frac{a}{b}$",
+        r"\beta + \nabla \theta \rho",
+        r"\alpha \[x\]",
+        r"\underline{y}",
+    ]
+
+
+def test_real_escapes_before_lowercase_words_are_kept():
+    # Invalid JSON elsewhere forces the repair path
+    text = r'{"a": "Step 1:\nthen apply\tthis", "b": "\frac{1}{2}",}'
+    assert repaired(text) == {"a": "Step 1:\nthen apply\tthis", "b": r"\frac{1}{2}"}
+
+
+def test_unicode_and_double_escapes_are_kept():
+    text = r'{"a": "é \\alpha \"q\""'
+    assert repaired(text) == {"a": 'é \\alpha "q"'}
+
+
+def test_raw_newlines_and_stray_quotes():
+    text = '{"a": "line1\nline2", "b": "he said "hi", then left"}'
+    assert repaired(text) == {"a": "line1\nline2", "b": 'he said "hi", then left'}
+
+
+def test_literals_after_comma_end_the_string():
+    assert repaired('{"a": ["x", -1],}') == {"a": ["x", -1]}
+    assert repaired('{"f": ["a", true],}') == {"f": ["a", True]}
+    assert repaired('{"f": ["a", false, null],}') == {"f": ["a", False, None]}
+
+
+def test_trailing_and_missing_commas():
+    assert repaired('{"a": [1, 2 3] "b": {"c": "d"},}') == {"a": [1, 2, 3], "b": {"c": "d"}}
+    assert repaired('{"a": "x"\n "b": 1}') == {"a": "x", "b": 1}
+    assert repaired('["a" "b"]') == ["a", "b"]
+    assert repaired('{"a": ["x" "y", "z"] "b": "w"}') == {"a": ["x", "y", "z"], "b": "w"}
+
+
+def test_leading_prose_and_code_fence():
+    text = 'Here it is:\n```json\n{"a": 1}\n```'
+    assert repaired(text) == {"a": 1}
+
+
+def test_truncated_output_keeps_complete_sections():
+    text = (
+        '{"title": "T", "sections": ['
+        '{"heading": "A", "bullets": [{"text": "x", "page": 3}]}, '
+        '{"heading": "B", "bullets": [{"text": "y", "page": 4}, {"text": "cut off mid'
+    )
+    result = repaired(text)
+    assert result["sections"][0] == {"heading": "A", "bullets": [{"text": "x", "page": 3}]}
+    assert result["sections"][1]["bullets"][0] == {"text": "y", "page": 4}
+
+
+def test_truncated_after_key_drops_dangling_key():
+    assert repaired('{"a": 1, "b":') == {"a": 1}
+    assert repaired('{"a": 1, "b') == {"a": 1}
+
+
+def test_loads_repaired_prefers_plain_parse():
+    assert loads_repaired('{"a": "\\n"}') == {"a": "\n"}
+
+
+def test_valid_json_with_latex_commands_is_repaired():
+    # Parses as-is, but \f and \b would become control characters
+    text = r'{"f": ["$\frac{a}{b}$", "\beta", "Step 1:\nthen"]}'
+    assert json.loads(text)["f"][0] == "$\x0crac{a}{b}$"
+    assert loads_repaired(text) == {"f": [r"$\frac{a}{b}$", r"\beta", "Step 1:\nthen"]}
+
+
+def test_latex_escape_detection():
+    assert has_latex_escape(r'"\frac{1}{2}"')
+    assert has_latex_escape(r'"\\\theta"')
+    assert not has_latex_escape(r'"\\frac"')
+    assert not has_latex_escape(r'"Step 1:\nthen"')
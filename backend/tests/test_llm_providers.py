@@ -0,0 +1,100 @@
+import threading
+import time
+
+from services import llm_providers
+from services.llm_providers import LLMProvider, LocalProvider, generate_topics, merge_topic_results
+
+
+class FlakyProvider(LLMProvider):
+    """Fails the first `failures` calls for each topic id"""
+    name = "flaky"
+
+    def __init__(self, failures, retryable=True):
+        self.failures = dict(failures)
+        self.retryable = retryable
+        self.calls = []
+
+    def generate(self, pages, doc_type="cheatsheet", topic=None):
+        self.calls.append(topic)
+        idx = topic[0]
+        if self.failures.get(idx, 0) > 0:
+            self.failures[idx] -= 1
+            return {"error": f"topic {idx} failed", "retryable": self.retryable}
+        return {"title": f"Topic {idx}", "sections": [{"heading": f"H{idx}", "bullets": []}]}
+
+
+def _topics(n):
+    return [[{"pdf_index": 0, "page": i}] for i in range(n)]
+
+
+def test_each_topic_gets_its_id_and_count():
+    provider = FlakyProvider({})
+    generate_topics(_topics(3), "cheatsheet", provider)
+    assert sorted(provider.calls) == [(0, 3), (1, 3), (2, 3)]
+
+
+def test_failed_topic_is_retried_once():
+    provider = FlakyProvider({1: 1})
+    merged = merge_topic_results(generate_topics(_topics(3), "cheatsheet", provider))
+
+    assert "failed_topics" not in merged
+    assert [s["topic"] for s in merged["sections"]] == [0, 1, 2]
+    assert provider.calls.count((1, 3)) == 2
+
+
+def test_non_retryable_failure_is_not_retried():
+    # e.g. a safety block, after the provider's own retries
+    provider = FlakyProvider({1: 1}, retryable=False)
+    merged = merge_topic_results(generate_topics(_topics(3), "cheatsheet", provider))
+
+    assert merged["failed_topics"] == [1]
+    assert provider.calls.count((1, 3)) == 1
+
+
+def test_topic_failing_twice_is_reported():
+    provider = FlakyProvider({6: 2})
+    merged = merge_topic_results(generate_topics(_topics(3), "cheatsheet", provider, topic_ids=[4, 5, 6]))
+
+    assert merged["failed_topics"] == [6]
+    assert merged["topic_errors"] == ["topic 6 failed"]
+    assert [s["topic"] for s in merged["sections"]] == [4, 5]
+
+
+def test_local_provider_is_deterministic():
+    pages = [
+        {"pdf_index": 0, "page": i, "section_title": f"Part {i // 2}", "formulas": ["$H = -\\sum p \\log p$"],
+         "full_text": "Entropy is defined as expected information. It is measured in bits. Capacity bounds the rate."}
+        for i in range(4)
+    ]
+    provider = LocalProvider()
+    first = provider.generate([dict(p) for p in pages])
+    assert first["sections"]
+    assert provider.generate([dict(p) for p in pages]) == first
+
+
+def test_provider_calls_share_one_concurrency_limit(monkeypatch):
+    monkeypatch.setattr(llm_providers, "_llm_slots", threading.BoundedSemaphore(2))
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    class SlowProvider(FlakyProvider):
+        def generate(self, pages, doc_type="cheatsheet", topic=None):
+            with lock:
+                running.append(topic)
+                peak.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.remove(topic)
+            return super().generate(pages, doc_type, topic)
+
+    # Two requests with several topics each, at the same time
+    threads = [
+        threading.Thread(target=generate_topics, args=(_topics(4), "cheatsheet", SlowProvider({})))
+        for _ in range(2)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert max(peak) == 2
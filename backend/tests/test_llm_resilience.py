@@ -0,0 +1,184 @@
+import random
+import threading
+import time
+
+import pytest
+
+from services.llm_resilience import (
+    LLMCallError,
+    LatencyTracker,
+    RetryPolicy,
+    call_with_resilience,
+    get_tracker,
+    is_transient,
+)
+
+
+class ServiceUnavailable(Exception):
+    """Matched by name like google.api_core.exceptions.ServiceUnavailable"""
+
+
+class PermissionDenied(Exception):
+    code = 403
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """
+    Local stand-in for genai.GenerativeModel that injects latency and errors.
+    Deterministic for a given seed.
+    """
+
+    def __init__(self, text="{}", latency=0.0, jitter=0.0, error_rate=0.0, error=ServiceUnavailable, seed=None):
+        self.text = text
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error = error
+        self.calls = 0
+        self.timeouts = []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, request_options=None):
+        with self._lock:
+            self.calls += 1
+            self.timeouts.append((request_options or {}).get("timeout"))
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            fail = self._rng.random() < self.error_rate
+        time.sleep(delay)
+        if fail:
+            raise self.error("Injected fake model error")
+        return FakeResponse(self.text)
+
+
+def policy(**kwargs):
+    defaults = dict(timeout=1.0, total_timeout=10.0, max_attempts=3, base_delay=0.001, max_delay=0.01, hedge_percentile=0)
+    defaults.update(kwargs)
+    return RetryPolicy(**defaults)
+
+
+def no_sleep(seconds):
+    pass
+
+
+def test_success_first_try():
+    model = FakeModel('{"a": 1}')
+    assert call_with_resilience([("ok-first", model)], "p", policy(), no_sleep) == ('{"a": 1}', "ok-first")
+    assert model.calls == 1
+
+
+def test_transient_errors_are_retried():
+    class Flaky(FakeModel):
+        def generate_content(self, prompt, request_options=None):
+            self.calls += 1
+            if self.calls < 3:
+                raise ServiceUnavailable("503")
+            return FakeResponse("done")
+
+    model = Flaky()
+    assert call_with_resilience([("flaky", model)], "p", policy(), no_sleep) == ("done", "flaky")
+    assert model.calls == 3
+
+
+def test_non_transient_error_is_not_retried():
+    model = FakeModel(error_rate=1.0, error=PermissionDenied)
+    fallback = FakeModel("fallback")
+    with pytest.raises(PermissionDenied):
+        call_with_resilience([("denied", model), ("fallback", fallback)], "p", policy(), no_sleep)
+    assert model.calls == 1
+    assert fallback.calls == 0
+
+
+def test_falls_back_to_next_model():
+    bad = FakeModel(error_rate=1.0)
+    good = FakeModel("cheap")
+    assert call_with_resilience([("bad", bad), ("cheap", good)], "p", policy(max_attempts=2), no_sleep) == ("cheap", "cheap")
+    assert bad.calls == 2
+
+
+def test_all_attempts_fail():
+    bad = FakeModel(error_rate=1.0)
+    with pytest.raises(LLMCallError) as exc:
+        call_with_resilience([("all-bad", bad)], "p", policy(max_attempts=2), no_sleep)
+    assert len(exc.value.errors) == 2
+
+
+def test_per_call_timeout_falls_back():
+    slow = FakeModel("slow", latency=0.5)
+    fast = FakeModel("fast")
+    started = time.monotonic()
+    result = call_with_resilience([("slow", slow), ("fast", fast)], "p", policy(timeout=0.05, max_attempts=1), no_sleep)
+    assert result == ("fast", "fast")
+    assert time.monotonic() - started < 0.4
+
+
+def test_fallback_is_reached_with_default_budget_ratios():
+    # Shipped defaults are timeout 90s, total 180s, 3 attempts: scaled down 1000x
+    hung = FakeModel("hung", latency=1.0)
+    fallback = FakeModel("fallback")
+    defaults = RetryPolicy()
+    ratios = policy(timeout=defaults.timeout / 1000, total_timeout=defaults.total_timeout / 1000,
+                    max_attempts=defaults.max_attempts)
+    assert call_with_resilience([("hung", hung), ("fallback", fallback)], "p", ratios, no_sleep) == ("fallback", "fallback")
+    assert fallback.calls == 1
+
+
+def test_each_call_gets_a_client_timeout():
+    model = FakeModel("ok")
+    call_with_resilience([("client-timeout", model)], "p", policy(timeout=0.5), no_sleep)
+    assert 0 < model.timeouts[0] <= 0.5
+
+
+def test_total_deadline_bounds_all_attempts():
+    slow = FakeModel("slow", latency=0.5)
+    started = time.monotonic()
+    with pytest.raises(LLMCallError):
+        call_with_resilience(
+            [("slow-a", slow), ("slow-b", slow)], "p",
+            policy(timeout=0.1, total_timeout=0.25, max_attempts=3), no_sleep
+        )
+    assert time.monotonic() - started < 0.45
+
+
+def test_hedged_request_beats_slow_primary():
+    class SlowFirst(FakeModel):
+        def generate_content(self, prompt, request_options=None):
+            with self._lock:
+                self.calls += 1
+                first = self.calls == 1
+            time.sleep(0.5 if first else 0.01)
+            return FakeResponse("hedged" if not first else "primary")
+
+    tracker = get_tracker("hedge-test")
+    for _ in range(10):
+        tracker.record(0.01)
+
+    model = SlowFirst()
+    result = call_with_resilience([("hedge-test", model)], "p", policy(hedge_percentile=95), no_sleep)
+    assert result == ("hedged", "hedge-test")
+    assert model.calls == 2
+
+
+def test_hedging_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("LLM_HEDGE_PERCENTILE", raising=False)
+    assert RetryPolicy().hedge_percentile == 0
+
+
+def test_latency_percentile():
+    tracker = LatencyTracker()
+    assert tracker.percentile(95) is None
+    for i in range(1, 101):
+        tracker.record(i / 100)
+    assert tracker.percentile(50) == pytest.approx(0.5, abs=0.02)
+
+
+def test_is_transient():
+    assert is_transient(TimeoutError())
+    assert is_transient(ServiceUnavailable())
+    assert not is_transient(PermissionDenied())
+    assert not is_transient(ValueError("blocked"))
@@ -0,0 +1,138 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from services.storage import JobNotFoundError, StorageManager
+
+
+def make_job(storage, job_id, age, upload=True):
+    os.makedirs(storage.job_dir(job_id))
+    storage.write_json(os.path.join(storage.job_dir(job_id), "pdf_00.json"), {"pages": ["x"] * 500})
+    if upload:
+        with open(os.path.join(storage.upload_dir, f"{job_id}_00_a.pdf"), "w") as f:
+            f.write("pdf")
+    t = time.time() - age
+    os.utime(storage.job_dir(job_id), (t, t))
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return StorageManager(str(tmp_path / "uploads"), str(tmp_path / "parsed"), ttl_seconds=100, quota_bytes=10**9, cold_after=10)
+
+
+def job_ids(n):
+    return [str(i) * 36 for i in range(n)]
+
+
+def test_ttl_expiry_compaction_and_upload_cleanup(storage):
+    fresh, cold, expired = job_ids(3)
+    make_job(storage, fresh, age=1)
+    make_job(storage, cold, age=50)
+    make_job(storage, expired, age=500)
+
+    storage.run_maintenance()
+
+    assert sorted(os.listdir(storage.parsed_dir)) == sorted([fresh, cold])
+    assert os.listdir(storage.upload_dir) == []
+    assert storage.parsed_files(fresh) == ["pdf_00.json"]
+    assert storage.parsed_files(cold) == ["pdf_00.json.gz"]
+    assert storage.load_json(os.path.join(storage.job_dir(cold), "pdf_00.json.gz"))["pages"][0] == "x"
+    assert storage.usage()["jobs"] == 2
+
+
+def test_quota_evicts_least_recently_used(storage):
+    newest, oldest = job_ids(2)
+    make_job(storage, newest, age=1, upload=False)
+    make_job(storage, oldest, age=5, upload=False)
+    storage.quota_bytes = storage.job_bytes(newest) + 10
+
+    storage.run_maintenance()
+
+    assert os.listdir(storage.parsed_dir) == [newest]
+
+
+def test_jobs_in_use_are_not_touched(storage):
+    (job,) = job_ids(1)
+    make_job(storage, job, age=500)
+    with storage.in_use(job):
+        storage.run_maintenance()
+        assert storage.parsed_files(job) == ["pdf_00.json"]
+
+
+def test_in_use_waits_for_maintenance_claim(storage):
+    (job,) = job_ids(1)
+    make_job(storage, job, age=1)
+    entered = threading.Event()
+
+    def use():
+        with storage.in_use(job):
+            entered.set()
+
+    with storage._claim(job) as claimed:
+        assert claimed
+        t = threading.Thread(target=use)
+        t.start()
+        assert not entered.wait(0.1)
+    t.join(1)
+    assert entered.is_set()
+
+
+def test_in_use_missing_job_raises(storage):
+    with pytest.raises(JobNotFoundError):
+        with storage.in_use("missing"):
+            pass
+    with storage.in_use("new", create=True):
+        assert os.path.isdir(storage.job_dir("new"))
+
+
+def test_using_waits_without_blocking_the_event_loop(storage):
+    (job,) = job_ids(1)
+    make_job(storage, job, age=1)
+    ticks = []
+
+    async def main():
+        async def use():
+            async with storage.using(job):
+                return len(ticks)
+
+        async def tick():
+            for _ in range(5):
+                ticks.append(1)
+                await asyncio.sleep(0.02)
+
+        with storage._claim(job):
+            task = asyncio.ensure_future(use())
+            await tick()
+        return await task
+
+    # The loop kept ticking while the job was claimed
+    assert asyncio.run(main()) == 5
+    assert job not in storage._active
+
+
+def test_exclusive_using_serializes_requests(storage):
+    (job,) = job_ids(1)
+    make_job(storage, job, age=1)
+    events = []
+
+    async def main():
+        async def write(name):
+            async with storage.using(job, exclusive=True):
+                events.append(f"{name} start")
+                await asyncio.sleep(0.02)
+                events.append(f"{name} end")
+
+        async def read():
+            async with storage.using(job):
+                events.append("read")
+
+        await asyncio.gather(write("a"), write("b"), read())
+
+    asyncio.run(main())
+    assert events.index("a end") < events.index("b start")
+    assert events.index("read") < events.index("a end")
+    assert storage._writers == {}
+    assert storage.next_pdf_index(job) == 1